@@ -1,17 +1,69 @@
 import pandas as pd
+import numpy as np
 from rapidfuzz import fuzz, process
 import os
-import PyPDF2
+import functools
+import multiprocessing
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import fitz
+import ahocorasick
+import zstandard
+
+# Extracted PDF text is cached next to each PDF, keyed on mtime and size
+PDF_TEXT_CACHE_SUFFIX = '.txt.zst'
+PDF_CACHE_KEYS_FILE = 'pdf_cache.json'
+
+
+def _extract_pdf(pdf_path):
+    """Extract the text of a PDF, returns (filename, text or None)
+
+    Module level so it can be sent to worker processes.
+    """
+    pdf_file = os.path.basename(pdf_path)
+    try:
+        doc = fitz.open(pdf_path)
+        try:
+            return pdf_file, "".join(page.get_text("text") for page in doc)
+        finally:
+            doc.close()
+    except fitz.FileDataError as e:
+        print(f"Corrupt or unreadable PDF {pdf_file}: {e}")
+    except Exception as e:
+        print(f"Error reading PDF {pdf_file}: {e}")
+    return pdf_file, None
+
 
 class DatasetSearchAgent:
+    # Response field -> dataset columns that may hold it, in order of preference
+    RESPONSE_COLUMNS = {
+        'brand_name': ('brand_name', 'brandname', 'name'),
+        'generic_name': ('generic_name', 'genericname'),
+        'composition': ('composition', 'ingredients'),
+        'uses': ('uses', 'indications'),
+        'side_effects': ('side_effects', 'sideeffects', 'adverse_effects'),
+        'manufacturer': ('manufacturer', 'company'),
+    }
+    
     def __init__(self):
         self.df = None
         self.pdf_data = []
+        self.name_contexts = {}
+        self._indexed_names = frozenset()
+        self._pdf_cache_file = None
+        self._pdf_cache_keys = {}
+        # Per-instance LRUs so repeated queries skip matching entirely
+        self._search_cached = functools.lru_cache(maxsize=2048)(self._search)
+        self._pdf_text = functools.lru_cache(maxsize=8)(self._load_pdf_text)
         self.load_dataset()
     
     def load_csv_files(self, data_dir):
         """Load all CSV files from data directory"""
-        csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
+        with os.scandir(data_dir) as it:
+            csv_entries = [e for e in it if e.is_file() and e.name.endswith('.csv')]
+        csv_files = [e.name for e in csv_entries]
         
         if not csv_files:
             print("No CSV files found")
@@ -19,35 +71,51 @@ class DatasetSearchAgent:
         
         print(f"Found CSV files: {csv_files}")
         
+        # Parse files concurrently; pyarrow releases the GIL while reading
+        csv_paths = [e.path for e in csv_entries]
+        with ThreadPoolExecutor() as executor:
+            loaded = list(executor.map(self._read_csv, csv_paths))
+        
         # Load first CSV or combine all CSVs
         dataframes = []
-        for csv_file in csv_files:
-            csv_path = os.path.join(data_dir, csv_file)
-            try:
-                df = pd.read_csv(csv_path, encoding='utf-8')
+        for csv_file, df in zip(csv_files, loaded):
+            if df is not None:
                 print(f"Loaded {csv_file}: {len(df)} records")
                 dataframes.append(df)
-            except Exception as e:
-                try:
-                    # Try different encoding
-                    df = pd.read_csv(csv_path, encoding='latin-1')
-                    print(f"Loaded {csv_file} with latin-1: {len(df)} records")
-                    dataframes.append(df)
-                except Exception as e2:
-                    print(f"Error loading {csv_file}: {e2}")
         
         if dataframes:
-            # Combine all dataframes
-            combined_df = pd.concat(dataframes, ignore_index=True)
+            # Combine all dataframes (a single file needs no copy at all)
+            if len(dataframes) == 1:
+                combined_df = dataframes[0]
+            else:
+                combined_df = pd.concat(dataframes, ignore_index=True, copy=False, sort=False)
             # Standardize column names
-            combined_df.columns = combined_df.columns.str.lower().str.replace(' ', '_')
+            combined_df.rename(
+                columns={c: str(c).lower().replace(' ', '_') for c in combined_df.columns},
+                inplace=True
+            )
             return combined_df
         
         return None
     
+    def _read_csv(self, csv_path):
+        """Read a single CSV file, returns None if it can't be parsed"""
+        csv_file = os.path.basename(csv_path)
+        try:
+            return pd.read_csv(csv_path, engine='pyarrow', encoding='utf-8')
+        except Exception:
+            try:
+                # Try different encoding (pyarrow only handles clean UTF-8)
+                return pd.read_csv(csv_path, encoding='latin-1')
+            except Exception as e:
+                print(f"Error loading {csv_file}: {e}")
+                return None
+    
     def load_pdf_files(self, data_dir):
-        """Extract medicine data from PDF files"""
-        pdf_files = [f for f in os.listdir(data_dir) if f.endswith('.pdf')]
+        """Find PDF files in data directory (text is extracted on demand)"""
+        with os.scandir(data_dir) as it:
+            pdf_entries = [e for e in it if e.is_file() and e.name.endswith('.pdf')]
+        pdf_files = [e.name for e in pdf_entries]
         
         if not pdf_files:
             print("No PDF files found")
@@ -55,26 +123,142 @@ class DatasetSearchAgent:
         
         print(f"Found PDF files: {pdf_files}")
         
-        extracted_data = []
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(data_dir, pdf_file)
+        self._pdf_cache_file = os.path.join(data_dir, PDF_CACHE_KEYS_FILE)
+        self._pdf_cache_keys = self._load_pdf_cache_keys()
+        
+        pdfs = []
+        for e in pdf_entries:
+            stat = e.stat()
+            pdfs.append({
+                'filename': e.name,
+                'path': e.path,
+                'cache_key': [stat.st_mtime_ns, stat.st_size]
+            })
+        return pdfs
+    
+    def _load_pdf_cache_keys(self):
+        """Read the filename -> [mtime_ns, size] sidecar for the text caches"""
+        try:
+            with open(self._pdf_cache_file, 'r', encoding='utf-8') as f:
+                keys = json.load(f)
+            return keys if isinstance(keys, dict) else {}
+        except (OSError, ValueError):
+            return {}
+    
+    def _save_pdf_cache_keys(self):
+        """Write the text cache sidecar"""
+        try:
+            with open(self._pdf_cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self._pdf_cache_keys, f)
+        except OSError as e:
+            print(f"Could not write PDF cache index: {e}")
+    
+    def _read_text_cache(self, pdf):
+        """Return the cached text of a PDF, or None if missing or stale"""
+        if self._pdf_cache_keys.get(pdf['filename']) != pdf['cache_key']:
+            return None
+        try:
+            with open(pdf['path'] + PDF_TEXT_CACHE_SUFFIX, 'rb') as f:
+                return zstandard.ZstdDecompressor().decompress(f.read()).decode('utf-8')
+        except (OSError, zstandard.ZstdError, UnicodeDecodeError):
+            return None
+    
+    def _write_text_cache(self, pdf, text):
+        """Compress extracted text next to the PDF and record its key"""
+        try:
+            with open(pdf['path'] + PDF_TEXT_CACHE_SUFFIX, 'wb') as f:
+                f.write(zstandard.ZstdCompressor(level=3).compress(text.encode('utf-8')))
+            self._pdf_cache_keys[pdf['filename']] = pdf['cache_key']
+        except OSError as e:
+            print(f"Could not cache text for {pdf['filename']}: {e}")
+    
+    def _load_pdf_text(self, pdf_path):
+        """Return (text, lowercased text) for a PDF, used behind a small LRU cache"""
+        pdf = next((p for p in self.pdf_data if p['path'] == pdf_path), None)
+        text = self._read_text_cache(pdf) if pdf else None
+        if text is None:
+            pdf_file, text = _extract_pdf(pdf_path)
+        if text is None:
+            return None
+        return text, text.lower()
+    
+    def build_pdf_index(self):
+        """Locate all CSV medicine names in PDF text with one Aho-Corasick pass per PDF"""
+        self.name_contexts = {}
+        self._indexed_names = frozenset()
+        
+        if not self.pdf_data:
+            return
+        
+        names = {name.lower() for name in self.get_all_medicine_names() if name.strip()}
+        
+        automaton = None
+        if names:
+            automaton = ahocorasick.Automaton()
+            for name in names:
+                automaton.add_word(name, name)
+            automaton.make_automaton()
+        
+        # Text is streamed through the automaton and dropped; only the context
+        # around the first occurrence of each name is kept in memory
+        readable = []
+        for pdf, text in zip(self.pdf_data, self._extract_all_pdfs()):
+            if text is None:
+                continue
+            
+            pdf_idx = len(readable)
+            readable.append(pdf)
+            print(f"Extracted text from {pdf['filename']}: {len(text)} characters")
+            
+            if automaton is None:
+                continue
+            
+            for end_index, name in automaton.iter(text.lower()):
+                if name not in self.name_contexts:
+                    index = end_index - len(name) + 1
+                    self.name_contexts[name] = (pdf_idx, self._pdf_context(text, index))
+        
+        self.pdf_data = readable
+        self._indexed_names = frozenset(names)
+        print(f"Indexed {len(self.name_contexts)} medicine names in PDF content")
+    
+    def _extract_all_pdfs(self):
+        """Return the text of every PDF in order, reusing fresh on-disk caches"""
+        texts = [self._read_text_cache(pdf) for pdf in self.pdf_data]
+        missing = [i for i, text in enumerate(texts) if text is None]
+        
+        if len(missing) < len(texts):
+            print(f"Loaded cached text for {len(texts) - len(missing)} PDF files")
+        
+        if missing:
+            extracted = self._extract_pdfs([self.pdf_data[i]['path'] for i in missing])
+            for i, text in zip(missing, extracted):
+                texts[i] = text
+                if text is not None:
+                    self._write_text_cache(self.pdf_data[i], text)
+            self._save_pdf_cache_keys()
+        
+        return texts
+    
+    def _extract_pdfs(self, paths):
+        """Extract the text of the given PDFs in order, in parallel when there are several"""
+        if len(paths) > 1:
             try:
-                with open(pdf_path, 'rb') as file:
-                    reader = PyPDF2.PdfReader(file)
-                    text = ""
-                    for page in reader.pages:
-                        text += page.extract_text()
-                    
-                    # Store PDF text for keyword search
-                    extracted_data.append({
-                        'filename': pdf_file,
-                        'content': text
-                    })
-                    print(f"Extracted text from {pdf_file}: {len(text)} characters")
-            except Exception as e:
-                print(f"Error reading PDF {pdf_file}: {e}")
+                # Parsing is CPU-bound, so use processes rather than threads. Spawn them fresh:
+                # forking a server process that already runs threads can deadlock the child
+                with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1),
+                                         mp_context=multiprocessing.get_context('spawn')) as executor:
+                    return [text for pdf_file, text in executor.map(_extract_pdf, paths)]
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                print(f"Parallel PDF extraction unavailable ({e}), extracting sequentially")
         
-        return extracted_data
+        return [_extract_pdf(path)[1] for path in paths]
+    
+    def _pdf_context(self, text, index):
+        """Extract context around a medicine name"""
+        start = max(0, index - 200)
+        end = min(len(text), index + 500)
+        return text[start:end]
     
     def load_dataset(self):
         """Load medicine dataset from CSV and PDF files"""
@@ -85,25 +269,100 @@ class DatasetSearchAgent:
                 os.makedirs(data_dir)
                 print(f"Created data directory at {data_dir}")
                 self.create_sample_dataset()
-                return
-            
-            # Load CSV files
-            self.df = self.load_csv_files(data_dir)
-            
-            # Load PDF files
-            self.pdf_data = self.load_pdf_files(data_dir)
-            
-            # If no data loaded, create sample
-            if self.df is None and not self.pdf_data:
-                print("No dataset files found, creating sample data")
-                self.create_sample_dataset()
             else:
-                total_records = len(self.df) if self.df is not None else 0
-                print(f"Dataset loaded successfully: {total_records} CSV records, {len(self.pdf_data)} PDF files")
+                # Load CSV files
+                self.df = self.load_csv_files(data_dir)
+                
+                # Load PDF files
+                self.pdf_data = self.load_pdf_files(data_dir)
+                
+                # If no data loaded, create sample
+                if self.df is None and not self.pdf_data:
+                    print("No dataset files found, creating sample data")
+                    self.create_sample_dataset()
+                else:
+                    total_records = len(self.df) if self.df is not None else 0
+                    print(f"Dataset loaded successfully: {total_records} CSV records, {len(self.pdf_data)} PDF files")
                 
         except Exception as e:
             print(f"Error loading dataset: {e}")
             self.create_sample_dataset()
+        
+        # Precompute lookup structures so searches don't rebuild them per query
+        self.build_csv_index()
+        
+        # Index CSV medicine names against PDF text
+        self.build_pdf_index()
+        
+        # Cached results refer to the previous dataset
+        self._search_cached.cache_clear()
+        self._pdf_text.cache_clear()
+        
+        # The dataset is static between loads, so summarize it once for the info endpoints
+        self._dataset_info = {
+            'csv_loaded': self.df is not None,
+            'csv_records': len(self.df) if self.df is not None else 0,
+            'csv_columns': list(self.df.columns) if self.df is not None else [],
+            'pdf_loaded': len(self.pdf_data) > 0,
+            'pdf_files': [pdf['filename'] for pdf in self.pdf_data],
+            'total_medicines': len(self._unique_names)
+        }
+        # Changes only when the loaded data does; HTTP handlers use it as an ETag
+        fingerprint = hashlib.sha1()
+        for part in (self._dataset_info['csv_columns'], self._dataset_info['pdf_files'], self._unique_names):
+            fingerprint.update('\x1f'.join(map(str, part)).encode('utf-8'))
+            fingerprint.update(b'\x1e')
+        fingerprint.update(str(self._dataset_info['csv_records']).encode())
+        self.version = fingerprint.hexdigest()[:16]
+    
+    def build_csv_index(self):
+        """Detect the medicine name column and cache its values for fuzzy matching"""
+        self._name_col = None
+        self._name_choices = []
+        self._choices_norm = []
+        self._exact_index = {}
+        self._unique_names = ()
+        self._unique_names_norm = ()
+        self._columns = {}
+        
+        if self.df is None or self.df.empty:
+            return
+        
+        # Try to find brand_name column (could be 'brand_name', 'brandname', 'name', etc.)
+        possible_name_cols = ['brand_name', 'brandname', 'name', 'medicine_name', 'product_name']
+        name_col = None
+        
+        for col in possible_name_cols:
+            if col in self.df.columns:
+                name_col = col
+                break
+        
+        if name_col is None:
+            # Use first column as default
+            name_col = self.df.columns[0]
+            print(f"Using column '{name_col}' as medicine name")
+        
+        self._name_col = name_col
+        self._name_choices = self.df[name_col].astype(str).tolist()
+        # Normalized once so the matcher never re-processes choices per query. Kept as a
+        # list of str: cdist converts each choice from a Python string anyway, so a packed
+        # bytes buffer would have to be split back into strings on every query
+        self._choices_norm = [name.lower().strip() for name in self._name_choices]
+        
+        # Case-insensitive exact name -> first row position
+        for idx, name in enumerate(self._choices_norm):
+            self._exact_index.setdefault(name, idx)
+        
+        # Remove duplicates once, keeping a stable order for clients
+        self._unique_names = tuple(dict.fromkeys(self._name_choices))
+        # Lowercased in the same order, so suggest() scores case-insensitively
+        self._unique_names_norm = tuple(name.lower().strip() for name in self._unique_names)
+        
+        # Resolve column aliases once and keep plain lists for row access
+        for field, candidates in self.RESPONSE_COLUMNS.items():
+            col = next((c for c in candidates if c in self.df.columns), None)
+            if col is not None:
+                self._columns[field] = self.df[col].astype(object).tolist()
     
     def create_sample_dataset(self):
         """Create a sample dataset if files not found"""
@@ -131,120 +390,146 @@ class DatasetSearchAgent:
     
     def search_in_csv(self, medicine_name, threshold=70):
         """Search in CSV data"""
-        if self.df is None or self.df.empty:
-            return None
-        
-        # Try to find brand_name column (could be 'brand_name', 'brandname', 'name', etc.)
-        possible_name_cols = ['brand_name', 'brandname', 'name', 'medicine_name', 'product_name']
-        name_col = None
-        
-        for col in possible_name_cols:
-            if col in self.df.columns:
-                name_col = col
-                break
-        
-        if name_col is None:
-            # Use first column as default
-            name_col = self.df.columns[0]
-            print(f"Using column '{name_col}' as medicine name")
+        return self.search_batch([medicine_name], threshold)[0]
+    
+    def search_batch(self, medicine_names, threshold=70):
+        """Fuzzy match several medicine names against CSV data in one vectorized pass"""
+        if self.df is None or self.df.empty or not self._name_choices:
+            return [None] * len(medicine_names)
         
-        # Get all medicine names
-        medicine_names = self.df[name_col].astype(str).tolist()
+        # Score every query against every name at once; weak matches are cut to 0
+        queries = [name.lower().strip() for name in medicine_names]
+        scores = process.cdist(
+            queries,
+            self._choices_norm,
+            scorer=fuzz.ratio,
+            processor=None,
+            score_cutoff=threshold,
+            dtype=np.uint8,
+            workers=-1
+        )
+        best_indices = scores.argmax(axis=1)
         
-        # Fuzzy match
-        result = process.extractOne(medicine_name, medicine_names, scorer=fuzz.ratio)
+        results = []
+        for row, best_idx in enumerate(best_indices):
+            score = int(scores[row, best_idx])
+            if score and score >= threshold:
+                results.append(self._build_csv_response(int(best_idx), score / 100.0))
+            else:
+                results.append(None)
         
-        if result and result[1] >= threshold:
-            matched_name = result[0]
-            confidence = result[1] / 100.0
-            
-            # Get the medicine row
-            medicine_row = self.df[self.df[name_col] == matched_name].iloc[0]
-            
-            # Dynamically build response based on available columns
-            response = {
-                'brand_name': medicine_row.get('brand_name', medicine_row.get('brandname', medicine_row.get('name', matched_name))),
-                'generic_name': medicine_row.get('generic_name', medicine_row.get('genericname', 'N/A')),
-                'composition': medicine_row.get('composition', medicine_row.get('ingredients', 'N/A')),
-                'uses': medicine_row.get('uses', medicine_row.get('indications', 'N/A')),
-                'side_effects': medicine_row.get('side_effects', medicine_row.get('sideeffects', medicine_row.get('adverse_effects', 'N/A'))),
-                'manufacturer': medicine_row.get('manufacturer', medicine_row.get('company', 'N/A')),
-                'confidence': confidence,
-                'source': 'CSV Database'
-            }
-            
-            return response
+        return results
+    
+    def _build_csv_response(self, row_idx, confidence):
+        """Build the search response for a matched CSV medicine"""
+        # Choices are cached in row order, so the match index is the row position
+        response = {}
+        for field in self.RESPONSE_COLUMNS:
+            values = self._columns.get(field)
+            if values is not None:
+                response[field] = values[row_idx]
+            elif field == 'brand_name':
+                response[field] = self._name_choices[row_idx]
+            else:
+                response[field] = 'N/A'
         
-        return None
+        response['confidence'] = confidence
+        response['source'] = 'CSV Database'
+        return response
     
     def search_in_pdf(self, medicine_name):
         """Search for medicine in PDF content"""
         if not self.pdf_data:
             return None
         
-        best_match = None
-        best_score = 0
+        medicine_lower = medicine_name.lower().strip()
+        # find('') is 0, which would turn an empty name into a hit
+        if not medicine_lower:
+            return None
+        
+        # Dataset names were located at load time, so they never need a scan
+        hit = self.name_contexts.get(medicine_lower)
+        if hit is not None:
+            pdf_idx, context = hit
+            return self._build_pdf_response(medicine_name, context, self.pdf_data[pdf_idx]['filename'])
+        if medicine_lower in self._indexed_names:
+            return None
         
         for pdf in self.pdf_data:
-            content = pdf['content'].lower()
-            medicine_lower = medicine_name.lower()
+            loaded = self._pdf_text(pdf['path'])
+            if loaded is None:
+                continue
+            content, content_lower = loaded
             
             # Check if medicine name appears in PDF
-            if medicine_lower in content:
-                # Extract context around the medicine name
-                index = content.find(medicine_lower)
-                start = max(0, index - 200)
-                end = min(len(content), index + 500)
-                context = content[start:end]
-                
-                # Calculate relevance score
-                score = fuzz.partial_ratio(medicine_name, context)
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = {
-                        'brand_name': medicine_name.title(),
-                        'generic_name': 'Information from PDF',
-                        'composition': 'N/A',
-                        'uses': context[:300] + '...',
-                        'side_effects': 'Refer to full document',
-                        'manufacturer': 'N/A',
-                        'confidence': score / 100.0,
-                        'source': f"PDF: {pdf['filename']}"
-                    }
-        
-        return best_match if best_score > 60 else None
+            index = content_lower.find(medicine_lower)
+            if index != -1:
+                return self._build_pdf_response(medicine_name, self._pdf_context(content, index), pdf['filename'])
+        
+        return None
+    
+    def _build_pdf_response(self, medicine_name, context, filename):
+        """Build the search response for a medicine found in a PDF"""
+        # The full name occurs literally in the text, so relevance is 100
+        # and no later PDF can score higher
+        return {
+            'brand_name': medicine_name.title(),
+            'generic_name': 'Information from PDF',
+            'composition': 'N/A',
+            'uses': context[:300] + '...',
+            'side_effects': 'Refer to full document',
+            'manufacturer': 'N/A',
+            'confidence': 1.0,
+            'source': f"PDF: {filename}"
+        }
     
     def search(self, medicine_name, threshold=70):
         """Search for medicine in both CSV and PDF sources"""
+        # Key on the normalized name so "Panadol " and "panadol" share one entry
+        result = self._search_cached(medicine_name.strip().lower(), threshold)
+        # Return a copy so callers can't modify the cached entry
+        return dict(result) if result else result
+    
+    def _search(self, medicine_name, threshold):
+        """Uncached search used behind the LRU cache"""
+        # Exact brand name matches bypass fuzzy matching
+        exact_idx = self._exact_index.get(medicine_name.lower().strip())
+        if exact_idx is not None:
+            return self._build_csv_response(exact_idx, 1.0)
+        
         # Try CSV first (more structured)
         csv_result = self.search_in_csv(medicine_name, threshold)
         
-        if csv_result and csv_result['confidence'] > 0.85:
+        # Only a near-certain CSV match skips the PDFs
+        if csv_result and csv_result['confidence'] >= 0.95:
             return csv_result
         
-        # Try PDF if CSV match is weak or not found
-        pdf_result = self.search_in_pdf(medicine_name)
-        
-        # Return best result
-        if csv_result and pdf_result:
-            return csv_result if csv_result['confidence'] > pdf_result['confidence'] else pdf_result
-        
-        return csv_result or pdf_result
+        # Only scan PDFs when the CSV match is weak or missing; a PDF hit is
+        # an exact substring match, so it always outranks a weak CSV match
+        return self.search_in_pdf(medicine_name) or csv_result
     
     def get_all_medicine_names(self):
         """Get list of all medicine names for autocomplete"""
-        names = []
-        
-        if self.df is not None:
-            # Find name column
-            possible_cols = ['brand_name', 'brandname', 'name', 'medicine_name']
-            for col in possible_cols:
-                if col in self.df.columns:
-                    names.extend(self.df[col].astype(str).tolist())
-                    break
+        return self._unique_names
+    
+    def get_dataset_info(self):
+        """Summary of the loaded dataset (computed at load time, copy before mutating)"""
+        return self._dataset_info
+    
+    def suggest(self, prefix, k=10):
+        """Get the top-k medicine names closest to a partial query"""
+        names = self._unique_names
+        query = prefix.lower().strip()
+        if not names or not query:
+            return []
         
-        return list(set(names))  # Remove duplicates
+        # Keep scores as uint8 and only order the top k (deduplicated names, so no repeats)
+        scores = process.cdist([query], self._unique_names_norm, scorer=fuzz.WRatio, processor=None,
+                               dtype=np.uint8, workers=-1)[0]
+        k = max(1, min(k, len(names)))
+        top = np.argpartition(-scores.astype(np.int16), k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top].astype(np.int16)))]
+        return [names[i] for i in top]
     
     def is_loaded(self):
         """Check if dataset is loaded"""
@@ -1,7 +1,143 @@
-import requests
-import json
-import re
+import asyncio
+import httpx
+import logging
+import functools
 import os
+import sqlite3
+import threading
+import time
+import zstandard
+from rapidfuzz import fuzz, process
+from collections import OrderedDict
+
+from .explanation_core import (
+    SYSTEM_MESSAGE, brand_numbers, build_prompt, explanation_fields_text, find_medical_advice,
+    json_dumps, json_loads, normalize_brand, parse_explanation
+)
+
+log = logging.getLogger(__name__)
+
+CACHE_DB_PATH = os.getenv(
+    'EXPLANATION_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'explanations.db')
+)
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# API timeouts: fail fast on connect, size the read timeout from observed latency
+CONNECT_TIMEOUT = 3.0
+MIN_READ_TIMEOUT = 5.0
+MAX_READ_TIMEOUT = 30.0
+BATCH_DEADLINE_SECONDS = 45.0
+
+# Fallback explanation text; only the medicine fields are formatted in per call
+_FALLBACK_DESCRIPTION_HAS_DATA = "{brand} is a registered pharmaceutical product in Pakistan, manufactured by {manufacturer}.{generic_info} This medicine has been officially approved for distribution in Pakistan by the Drug Regulatory Authority of Pakistan (DRAP). It undergoes quality control and meets local pharmaceutical standards. For complete medical information including detailed composition, therapeutic indications, mechanism of action, and usage guidelines, please refer to the official package insert or consult with a licensed pharmacist or healthcare provider."
+_FALLBACK_USES_HAS_DATA = "As a registered medicine in Pakistan's pharmaceutical database, {brand} has approved therapeutic indications. The specific medical uses, conditions it treats, and therapeutic applications are detailed in the official prescribing information. Common uses for medicines in this category typically include treatment of specific medical conditions based on the active ingredient{generic_suffix}. For accurate information about approved indications, recommended patient populations, and proper therapeutic use, please consult the package insert, speak with your pharmacist, or contact your healthcare provider."
+_FALLBACK_FIRST_SIDE_EFFECT_HAS_DATA = "Common side effects: Like all medications, {brand} may cause side effects in some patients. The frequency and severity vary by individual"
+_FALLBACK_SIDE_EFFECTS_HAS_DATA = (
+    "Mild reactions: May include nausea, headache, dizziness, stomach upset, or drowsiness depending on the medication class",
+    "Allergic reactions: Watch for signs of allergic reactions including skin rash, itching, swelling, or difficulty breathing",
+    "Serious effects: Stop use and seek immediate medical attention if you experience severe reactions, unusual symptoms, or signs of overdose",
+    "Individual variation: Not everyone experiences side effects - many people use this medicine with minimal issues",
+    "Complete information: Check the official package insert for a comprehensive list of potential side effects and their frequencies",
+    "Report symptoms: Always inform your healthcare provider about any unusual or persistent symptoms",
+)
+_FALLBACK_WARNINGS_HAS_DATA = "⚠️ IMPORTANT SAFETY INFORMATION FOR {brand}: This medicine is a regulated pharmaceutical product in Pakistan. GENERAL PRECAUTIONS: Always read the complete package insert before first use. Follow the prescribed dosage and duration exactly as directed by your healthcare provider. SPECIAL POPULATIONS: Consult your doctor before use if you are pregnant, planning pregnancy, breastfeeding, elderly, or treating children. MEDICAL CONDITIONS: Inform your doctor about all existing medical conditions, especially liver disease, kidney disease, heart conditions, diabetes, or blood disorders. DRUG INTERACTIONS: Tell your healthcare provider about all medications, supplements, and herbal products you are currently taking to avoid potential interactions. ALLERGIES: Do not use if you have known allergies to {allergen}. STORAGE: Keep out of reach of children. Store as directed on the package (usually at room temperature, away from moisture and heat). OVERDOSE: In case of overdose or severe reaction, seek immediate medical attention or contact emergency services. PURCHASE: Only buy from licensed, authorized pharmacies to ensure product authenticity and quality. DISPOSAL: Dispose of expired or unused medication properly - return to pharmacy or follow local disposal guidelines."
+
+_FALLBACK_DESCRIPTION_NO_DATA = "{brand} is a pharmaceutical medication. Based on common medical knowledge and the medicine name, this appears to be a recognized pharmaceutical product used for therapeutic purposes. The specific formulation, active ingredients, and approved uses may vary by region and manufacturer. For detailed information about the exact formulation available in your area, consulting with a registered pharmacist or healthcare provider is recommended."
+_FALLBACK_USES_NO_DATA = "{brand} is typically used for specific therapeutic purposes based on its active ingredient and drug classification. Common medical applications may include treatment of particular health conditions, symptom management, or disease control. The appropriate use depends on individual patient factors, medical history, and current health status. Your healthcare provider can determine if this medication is suitable for your specific condition and provide guidance on proper therapeutic applications."
+_FALLBACK_SIDE_EFFECTS_NO_DATA = (
+    "Possible mild effects may include nausea, headache, or dizziness in some users",
+    "Drowsiness or fatigue can occur - avoid driving if affected",
+    "Stomach discomfort or digestive issues may be experienced",
+    "Allergic reactions possible - watch for skin rash, itching, or swelling",
+    "Some individuals may experience changes in appetite or sleep patterns",
+    "Serious side effects are uncommon but require immediate medical attention",
+    "Individual responses vary - consult your doctor if any symptoms persist",
+)
+_FALLBACK_WARNINGS_NO_DATA = "Important safety information for {brand}: Consult your healthcare provider before use, especially if you are pregnant, breastfeeding, have existing medical conditions, or take other medications. Follow the prescribed or recommended dosage carefully. Do not exceed the recommended duration of use without medical supervision. Keep out of reach of children. Store at room temperature away from moisture and heat. Seek immediate medical attention if you experience severe reactions or symptoms worsen. Only purchase from licensed, authorized pharmacies to ensure product quality and authenticity."
+
+
+class ExplanationCache:
+    """Two-tier cache of generated explanations: in-process LRU backed by SQLite
+    
+    Entries are kept as zstd-compressed JSON in both tiers, so the same memory
+    budget holds several times more explanations.
+    """
+    
+    def __init__(self, db_path=CACHE_DB_PATH, maxsize=4096, ttl=CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # zstd contexts are not thread-safe; only used while holding _lock
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._db = None
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS explanation_blobs (key TEXT PRIMARY KEY, blob BLOB, ts INTEGER)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            log.warning("⚠️ Explanation disk cache unavailable (%s), using memory only", e)
+            self._db = None
+    
+    def get(self, key):
+        """Return a cached explanation dict, checking memory then disk"""
+        now = int(time.time())
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                ts, blob = entry
+                if now - ts < self.ttl:
+                    self._memory.move_to_end(key)
+                    return json_loads(self._decompressor.decompress(blob))
+                del self._memory[key]
+            
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT blob, ts FROM explanation_blobs WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+            if row is None or now - row[1] >= self.ttl:
+                return None
+            try:
+                value = json_loads(self._decompressor.decompress(row[0]))
+            except (zstandard.ZstdError, ValueError):
+                return None
+            self._remember(key, row[1], row[0])
+        return value
+    
+    def set(self, key, value):
+        """Write an explanation through to both tiers"""
+        now = int(time.time())
+        with self._lock:
+            blob = self._compressor.compress(json_dumps(value))
+            self._remember(key, now, blob)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO explanation_blobs (key, blob, ts) VALUES (?, ?, ?)",
+                    (key, blob, now)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                log.warning("⚠️ Could not persist explanation: %s", e)
+    
+    def _remember(self, key, ts, blob):
+        """Insert into the in-memory LRU, evicting the oldest entry when full"""
+        self._memory[key] = (ts, blob)
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
 
 class ExplanationAgent:
     def __init__(self):
@@ -9,34 +145,70 @@ class ExplanationAgent:
         self.api_url = "https://openrouter.ai/api/v1/chat/completions"
         self.api_key = os.getenv('OPENROUTER_TEXT_API_KEY', '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')
         self.model = "openai/gpt-oss-20b"  # Same as text chat - free model
+        self.cache = ExplanationCache()
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "http://localhost:5173",
+            "X-Title": "AI-LTH Medicine Assistant"
+        }
+        self.client = self._create_client()
+        # (monotonic timestamp, available) from the last health check or API success
+        self._avail_cache = None
+        # Single-flight maps: only one API call per cache key runs at a time
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._inflight_async = {}
+        # Smoothed API latency and its mean deviation, TCP retransmit-timer style
+        self._latency_ewma = None
+        self._latency_dev = None
+        # Known brand names, used to fold near-duplicate spellings onto one cache key
+        self._canonical_brands = []
+        self._canonical_brand_set = frozenset()
+    
+    def _create_client(self):
+        """
+        Pooled HTTP/2 client shared by every thread, so concurrent calls to OpenRouter
+        ride one TLS connection as separate streams
+        """
+        transport = httpx.HTTPTransport(
+            http2=True,
+            retries=2,  # connection failures only
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+        return httpx.Client(
+            transport=transport,
+            headers=self.headers,
+            timeout=httpx.Timeout(MAX_READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+    
+    def _create_async_client(self):
+        """Async HTTP client for concurrent lookups, scoped to one event loop"""
+        # HTTP/2 multiplexes concurrent calls as streams, so a few connections are enough
+        return httpx.AsyncClient(
+            http2=True,
+            headers=self.headers,
+            timeout=httpx.Timeout(MAX_READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+        )
     
     def contains_medical_advice(self, text):
         """
         Check if text contains medical advice or dosage recommendations
         Returns True if unsafe content detected
         """
-        unsafe_patterns = [
-            r'\btake\s+\d+',  # "take 2 tablets"
-            r'\bdosage\s+is\s+\d+',  # "dosage is 500mg"
-            r'you\s+should\s+take',
-            r'recommended\s+dose\s+is',
-            r'\d+\s*mg\s+every',  # "500mg every 6 hours"
-            r'take\s+this\s+medicine',
-            r'consume\s+\d+',
-            r'administer\s+\d+',
-        ]
-        
-        text_lower = text.lower()
-        for pattern in unsafe_patterns:
-            if re.search(pattern, text_lower):
-                print(f"⚠️ Medical advice detected: {pattern}")
-                return True
+        phrase = find_medical_advice(text)
+        if phrase:
+            log.warning("⚠️ Medical advice detected: %s", phrase)
+            return True
         return False
     
-    def generate(self, medicine_data):
+    def generate(self, medicine_data, validate_query=None):
         """
         Generate structured medicine explanation using OpenRouter API
         Returns: dict with description and side_effects array as per backend.txt spec
+        With validate_query the same call also judges whether that query is about medicine
+        and the dict carries is_medicine (absent on fallback, which fails open)
         """
         brand = medicine_data.get('brand_name', 'N/A')
         generic = medicine_data.get('generic_name', 'N/A')
@@ -45,223 +217,296 @@ class ExplanationAgent:
         # Check if we have database info
         has_database_info = manufacturer != 'N/A'
         
-        # Create structured prompt for JSON response
-        if has_database_info:
-            prompt = f"""You are a Medicine Information Assistant for Pakistan. Provide comprehensive information about {brand}.
-
-Medicine: {brand}
-Manufacturer: {manufacturer}
-Generic: {generic if generic != 'N/A' else 'Not specified'}
-
-Return ONLY a JSON object with this exact structure (no markdown, no code blocks):
-{{
-  "description": "Comprehensive overview (3-4 sentences): What this medicine is, its active ingredients, drug class, and primary medical purpose. Be informative and educational.",
-  "uses": "Detailed medical uses and conditions it treats. Include: primary indications, therapeutic applications, and what symptoms/conditions it addresses. Use clear, patient-friendly language.",
-  "side_effects": ["Common side effect 1 with brief description", "Common side effect 2 with brief description", "Common side effect 3 with brief description", "Rare but serious side effect to watch for"],
-  "warnings": "Important safety information including: who should avoid it, drug interactions to be aware of, contraindications, special precautions for pregnant/breastfeeding women, and when to seek immediate medical attention."
-}}
-
-CRITICAL RULES:
-- Be comprehensive and educational (this is for patient awareness)
-- side_effects MUST be an array of 4-6 strings with brief descriptions
-- Include both common and serious side effects
-- Do NOT include dosage recommendations or instructions
-- Do NOT say "take this medicine" or give prescriptive medical advice
-- Focus on educational awareness and safety information
-- Use professional medical terminology but explain it clearly
-- Keep each section informative but concise"""
+        # Serve repeated lookups from the cache before building a prompt
+        cache_key = self._cache_key(brand, generic, manufacturer, has_database_info, validate_query)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            log.debug("⚡ Explanation cache hit for %s", brand)
+            return cached
+        
+        # Concurrent requests for the same medicine wait for the call already in flight
+        with self._inflight_lock:
+            done = self._inflight.get(cache_key)
+            leader = done is None
+            if leader:
+                done = self._inflight[cache_key] = threading.Event()
+        
+        if leader:
+            try:
+                explanation = self._request_explanation(brand, generic, manufacturer, has_database_info, validate_query)
+                if explanation is not None:
+                    self.cache.set(cache_key, explanation)
+            finally:
+                with self._inflight_lock:
+                    self._inflight.pop(cache_key, None)
+                done.set()
         else:
-            prompt = f"""You are a Medicine Information Assistant with comprehensive pharmaceutical knowledge. The medicine '{brand}' is NOT in our Pakistan database, but you should use your general medical knowledge to provide helpful information.
-
-IMPORTANT: Use your training data and medical knowledge to provide actual information about {brand} if you recognize it as a real medicine. Only say "not available" if you truly don't know this medicine.
-
-Return ONLY a JSON object with this exact structure (no markdown, no code blocks):
-{{
-  "description": "If you recognize {brand}: Provide a comprehensive 3-4 sentence overview explaining what this medicine is, its active ingredient(s), drug classification, and primary therapeutic purpose. Be specific and informative. If truly unknown: State it's not in database and may be spelled differently or be a regional brand name.",
-  "uses": "If you know {brand}: Provide detailed therapeutic uses, medical conditions it treats, primary indications, and what symptoms it addresses. Include specific conditions and use cases. If truly unknown: 'This specific brand is not in our database. Please verify the medicine name spelling or consult a pharmacist for information.'",
-  "side_effects": ["If you know {brand}: List 4-6 actual common and serious side effects based on the drug class/active ingredient", "Include both frequent mild effects and rare serious effects", "Be specific - not generic statements", "If truly unknown: 'Side effect information unavailable - verify medicine name and consult healthcare provider'"],
-  "warnings": "If you know {brand}: Provide comprehensive safety warnings including contraindications, drug interactions, pregnancy/breastfeeding warnings, and special precautions based on the drug class. If truly unknown: 'This medicine is not in our Pakistan database. Verify the spelling and brand name. DO NOT use any medicine without consulting a qualified healthcare professional. Always check official regulatory approval and purchase only from licensed pharmacies.'"
-}}
-
-CRITICAL INSTRUCTIONS:
-- ACTIVELY USE your medical knowledge - don't default to "not available" if you know the medicine
-- If {brand} is a common medicine (even if not in Pakistan database), provide full information
-- Be helpful and informative while maintaining safety focus
-- Only use "not available" responses if you genuinely don't recognize the medicine
-- Patient safety is paramount but so is providing useful information when you can"""
-
-        try:
-            print(f"🤖 Calling OpenRouter API for {brand}...")
-            print(f"📊 Has database info: {has_database_info}")
-            print(f"🔑 API Key present: {'Yes' if self.api_key and len(self.api_key) > 10 else 'No'}")
-            
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "http://localhost:5173",
-                "X-Title": "AI-LTH Medicine Assistant"
-            }
-            
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a medical information assistant. Return ONLY valid JSON. No markdown, no code blocks, no explanations. Just pure JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1200  # Increased for comprehensive responses
-            }
+            done.wait()
+            explanation = self.cache.get(cache_key)
+        
+        if explanation is None:
+            # Fallback only if API fails
+            log.info("⚠️ Using fallback explanation")
+            return self.generate_fallback_explanation_structured(medicine_data)
+        return explanation
+    
+    async def generate_async(self, medicine_data, client=None):
+        """
+        Async variant of generate() for use inside an event loop
+        Pass a shared client to reuse its connection pool across calls
+        """
+        brand = medicine_data.get('brand_name', 'N/A')
+        generic = medicine_data.get('generic_name', 'N/A')
+        manufacturer = medicine_data.get('manufacturer', 'N/A')
+        has_database_info = manufacturer != 'N/A'
+        
+        cache_key = self._cache_key(brand, generic, manufacturer, has_database_info)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            log.debug("⚡ Explanation cache hit for %s", brand)
+            return cached
+        
+        # Events belong to one event loop, so only coalesce calls on the same loop
+        loop = asyncio.get_running_loop()
+        inflight_key = (id(loop), cache_key)
+        done = self._inflight_async.get(inflight_key)
+        
+        if done is None:
+            done = self._inflight_async[inflight_key] = asyncio.Event()
+            try:
+                if client is None:
+                    async with self._create_async_client() as client:
+                        explanation = await self._request_explanation_async(client, brand, generic, manufacturer, has_database_info)
+                else:
+                    explanation = await self._request_explanation_async(client, brand, generic, manufacturer, has_database_info)
+                if explanation is not None:
+                    self.cache.set(cache_key, explanation)
+            finally:
+                self._inflight_async.pop(inflight_key, None)
+                done.set()
+        else:
+            await done.wait()
+            explanation = self.cache.get(cache_key)
+        
+        if explanation is None:
+            log.info("⚠️ Using fallback explanation")
+            return self.generate_fallback_explanation_structured(medicine_data)
+        return explanation
+    
+    def generate_batch(self, medicines, deadline=BATCH_DEADLINE_SECONDS):
+        """
+        Generate explanations for several medicines concurrently
+        Items still pending after `deadline` seconds get the fallback explanation
+        Returns a list of explanation dicts in the same order as the input
+        """
+        if not medicines:
+            return []
+        return asyncio.run(self._generate_batch_async(medicines, deadline))
+    
+    async def _generate_batch_async(self, medicines, deadline):
+        """Run generate_async for every medicine, at most 10 calls in flight"""
+        semaphore = asyncio.Semaphore(10)
+        
+        async with self._create_async_client() as client:
+            async def bounded(medicine_data):
+                async with semaphore:
+                    return await self.generate_async(medicine_data, client)
             
-            print(f"📤 Sending request to OpenRouter ({self.model})...")
+            # All items start together, so a per-item wait_for is the batch budget
+            results = await asyncio.gather(
+                *(asyncio.wait_for(bounded(m), timeout=deadline) for m in medicines),
+                return_exceptions=True
+            )
+        
+        return [
+            self.generate_fallback_explanation_structured(medicine_data) if isinstance(result, Exception) else result
+            for medicine_data, result in zip(medicines, results)
+        ]
+    
+    def set_canonical_brands(self, brand_names):
+        """Register known brand names so misspelled lookups share their cache entry"""
+        self._canonical_brands = list(dict.fromkeys(normalize_brand(str(name)) for name in brand_names))
+        self._canonical_brand_set = frozenset(self._canonical_brands)
+    
+    def _canonical_brand(self, brand):
+        """Normalize a brand and snap it to a known brand name when it is a near match"""
+        normalized = normalize_brand(str(brand))
+        if normalized in self._canonical_brand_set or not self._canonical_brands:
+            return normalized
+        match = process.extractOne(normalized, self._canonical_brands, scorer=fuzz.ratio, score_cutoff=92)
+        # "vitamin b 1" is one edit from "vitamin b 12" but a different medicine
+        if match and brand_numbers(match[0]) == brand_numbers(normalized):
+            return match[0]
+        return normalized
+    
+    def _cache_key(self, brand, generic, manufacturer, has_database_info, validate_query=None):
+        """Normalized cache key for a medicine lookup, plus the query when it was validated too"""
+        parts = [
+            self._canonical_brand(brand),
+            str(generic).lower().strip(),
+            str(manufacturer).lower().strip(),
+            has_database_info
+        ]
+        if validate_query:
+            parts.append(validate_query)
+        return json_dumps(parts).decode('utf-8')
+    
+    def _read_timeout(self):
+        """Read timeout from recent latency: smoothed mean plus 4 deviations, clamped"""
+        if self._latency_ewma is None:
+            return MAX_READ_TIMEOUT
+        estimate = self._latency_ewma + 4 * self._latency_dev
+        return min(MAX_READ_TIMEOUT, max(MIN_READ_TIMEOUT, estimate))
+    
+    def _record_latency(self, seconds):
+        """Fold a successful call's latency into the smoothed estimates"""
+        if self._latency_ewma is None:
+            self._latency_ewma = seconds
+            self._latency_dev = seconds / 2
+        else:
+            self._latency_dev = 0.75 * self._latency_dev + 0.25 * abs(self._latency_ewma - seconds)
+            self._latency_ewma = 0.875 * self._latency_ewma + 0.125 * seconds
+    
+    def _request_explanation(self, brand, generic, manufacturer, has_database_info, validate_query=None):
+        """
+        Call OpenRouter and parse the structured explanation
+        Returns None when the API fails or the response is unusable
+        """
+        payload = self._build_payload(
+            brand, generic, manufacturer, has_database_info, stream=True, validate_query=validate_query
+        )
+        
+        try:
+            log.debug("🤖 Calling OpenRouter API (%s) for %s, has database info: %s", self.model, brand, has_database_info)
             
-            response = requests.post(
+            started = time.monotonic()
+            with self.client.stream(
+                'POST',
                 self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=30
+                content=json_dumps(payload),
+                timeout=httpx.Timeout(self._read_timeout(), connect=CONNECT_TIMEOUT)
+            ) as response:
+                log.debug("📥 Received response: Status %s", response.status_code)
+                
+                if response.status_code == 200:
+                    self._mark_available()
+                    explanation_text = self._read_stream(response)
+                    if explanation_text is None:
+                        return None
+                    # Timed to the end of the stream, not the headers, so the estimate
+                    # covers the whole read like the non-streamed async path
+                    self._record_latency(time.monotonic() - started)
+                    return self._parse_response(explanation_text)
+                response.read()
+                log.error("❌ API returned status %s: %s", response.status_code, response.text)
+        except httpx.TimeoutException:
+            log.warning("⏱️ API timeout, using fallback")
+        except Exception as e:
+            log.error("❌ API error: %s", e)
+        
+        return None
+    
+    async def _request_explanation_async(self, client, brand, generic, manufacturer, has_database_info):
+        """Async counterpart of _request_explanation"""
+        payload = self._build_payload(brand, generic, manufacturer, has_database_info)
+        
+        try:
+            log.debug("🤖 Calling OpenRouter API for %s (async)", brand)
+            started = time.monotonic()
+            response = await client.post(
+                self.api_url,
+                content=json_dumps(payload),
+                timeout=httpx.Timeout(self._read_timeout(), connect=CONNECT_TIMEOUT)
             )
-            
-            print(f"📥 Received response: Status {response.status_code}")
+            log.debug("📥 Received response for %s: Status %s", brand, response.status_code)
             
             if response.status_code == 200:
-                result = response.json()
-                explanation_text = result['choices'][0]['message']['content'].strip()
-                print(f"✅ API response received ({len(explanation_text)} chars)")
-                
-                # Check for medical advice
-                if self.contains_medical_advice(explanation_text):
-                    print("⚠️ Medical advice detected, using safe fallback")
-                    return self.generate_fallback_explanation_structured(medicine_data)
-                
-                # Try to parse JSON response
-                try:
-                    # Remove markdown code blocks if present
-                    cleaned_text = explanation_text
-                    if '```json' in cleaned_text:
-                        cleaned_text = cleaned_text.split('```json')[1].split('```')[0].strip()
-                    elif '```' in cleaned_text:
-                        cleaned_text = cleaned_text.split('```')[1].split('```')[0].strip()
-                    
-                    # Remove any leading/trailing whitespace or newlines
-                    cleaned_text = cleaned_text.strip()
-                    
-                    # Fix common JSON issues
-                    # Remove trailing commas before closing braces/brackets
-                    cleaned_text = re.sub(r',(\s*[}\]])', r'\1', cleaned_text)
-                    # Ensure proper string escaping
-                    cleaned_text = cleaned_text.replace('\n', ' ')
-                    
-                    # Try to parse JSON
-                    structured_data = json.loads(cleaned_text)
-                    
-                    # Validate structure - ensure all required fields exist
-                    if not isinstance(structured_data, dict):
-                        raise ValueError("Response is not a dictionary")
-                    
-                    # Ensure side_effects is a list
-                    if 'side_effects' in structured_data and not isinstance(structured_data.get('side_effects'), list):
-                        structured_data['side_effects'] = [str(structured_data.get('side_effects', 'Information not available'))]
-                    
-                    # Ensure all required fields exist
-                    required_fields = ['description', 'uses', 'side_effects', 'warnings']
-                    for field in required_fields:
-                        if field not in structured_data:
-                            structured_data[field] = 'Information not available'
-                    
-                    print(f"✅ Successfully parsed structured JSON response")
-                    return structured_data
-                    
-                except (json.JSONDecodeError, ValueError) as e:
-                    print(f"⚠️ JSON parse error: {e}")
-                    print(f"Raw response (first 500 chars): {explanation_text[:500]}...")
-                    
-                    # Try aggressive JSON extraction and repair
-                    import re
-                    
-                    # Method 1: Extract just the JSON object
-                    json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', explanation_text, re.DOTALL)
-                    if json_match:
-                        try:
-                            print("🔄 Attempting to extract and repair JSON...")
-                            extracted_json = json_match.group(0)
-                            
-                            # Fix trailing commas
-                            extracted_json = re.sub(r',(\s*[}\]])', r'\1', extracted_json)
-                            # Remove newlines in strings
-                            extracted_json = extracted_json.replace('\n', ' ')
-                            
-                            structured_data = json.loads(extracted_json)
-                            
-                            # Ensure side_effects is a list
-                            if 'side_effects' in structured_data and not isinstance(structured_data.get('side_effects'), list):
-                                structured_data['side_effects'] = [str(structured_data.get('side_effects'))]
-                            
-                            # Fill missing fields
-                            required_fields = ['description', 'uses', 'side_effects', 'warnings']
-                            for field in required_fields:
-                                if field not in structured_data:
-                                    structured_data[field] = 'Information not available'
-                            
-                            print(f"✅ Successfully extracted and repaired JSON")
-                            return structured_data
-                        except Exception as repair_error:
-                            print(f"❌ JSON repair failed: {repair_error}")
-                    
-                    # Method 2: Manual field extraction
-                    print("🔄 Attempting manual field extraction...")
-                    try:
-                        desc_match = re.search(r'"description"\s*:\s*"([^"]*(?:"[^"]*)*)"', explanation_text, re.DOTALL)
-                        uses_match = re.search(r'"uses"\s*:\s*"([^"]*(?:"[^"]*)*)"', explanation_text, re.DOTALL)
-                        warn_match = re.search(r'"warnings"\s*:\s*"([^"]*(?:"[^"]*)*)"', explanation_text, re.DOTALL)
-                        side_match = re.search(r'"side_effects"\s*:\s*\[(.*?)\]', explanation_text, re.DOTALL)
-                        
-                        manual_data = {}
-                        if desc_match:
-                            manual_data['description'] = desc_match.group(1).strip()
-                        if uses_match:
-                            manual_data['uses'] = uses_match.group(1).strip()
-                        if warn_match:
-                            manual_data['warnings'] = warn_match.group(1).strip()
-                        if side_match:
-                            side_effects_str = side_match.group(1)
-                            side_effects = re.findall(r'"([^"]+)"', side_effects_str)
-                            manual_data['side_effects'] = side_effects if side_effects else ['Information not available']
-                        
-                        # Fill missing fields with defaults
-                        if 'description' not in manual_data:
-                            manual_data['description'] = 'Information extraction failed'
-                        if 'uses' not in manual_data:
-                            manual_data['uses'] = 'Please consult a healthcare provider'
-                        if 'side_effects' not in manual_data:
-                            manual_data['side_effects'] = ['Information not available']
-                        if 'warnings' not in manual_data:
-                            manual_data['warnings'] = 'Consult healthcare professionals'
-                        
-                        if len(manual_data) >= 3:  # At least 3 fields extracted
-                            print(f"✅ Successfully extracted fields manually")
-                            return manual_data
-                    except Exception as manual_error:
-                        print(f"❌ Manual extraction failed: {manual_error}")
-                    
-                    # Final fallback: Use comprehensive fallback function
-                    print("⚠️ All parsing methods failed, using fallback")
-                    return self.generate_fallback_explanation_structured(medicine_data)
-            else:
-                print(f"❌ API returned status {response.status_code}: {response.text}")
-        except requests.exceptions.Timeout:
-            print(f"⏱️ API timeout after 30s, using fallback")
+                self._record_latency(time.monotonic() - started)
+                self._mark_available()
+                result = json_loads(response.content)
+                return self._parse_response(result['choices'][0]['message']['content'])
+            log.error("❌ API returned status %s: %s", response.status_code, response.text)
+        except httpx.TimeoutException:
+            log.warning("⏱️ API timeout for %s, using fallback", brand)
         except Exception as e:
-            print(f"❌ API error: {e}")
+            log.error("❌ API error: %s", e)
+        
+        return None
+    
+    def _read_stream(self, response):
+        """
+        Accumulate streamed SSE content, aborting as soon as unsafe advice appears
+        Returns the full text, or None if the stream was cut short
+        """
+        parts = []
+        tail = ''
+        for line in response.iter_lines():
+            # Skip blank separators and keep-alive comments
+            if not line.startswith('data: '):
+                continue
+            data = line[6:]
+            if data == '[DONE]':
+                break
+            
+            choices = json_loads(data).get('choices')
+            if not choices:
+                continue
+            delta = (choices[0].get('delta') or {}).get('content')
+            if not delta:
+                continue
+            parts.append(delta)
+            
+            # Check the new text plus a short overlap so phrases split across chunks are caught
+            window = tail + delta
+            if find_medical_advice(window):
+                log.warning("⚠️ Medical advice detected mid-stream, aborting response")
+                return None
+            tail = window[-64:]
+        
+        return ''.join(parts)
+    
+    def _build_payload(self, brand, generic, manufacturer, has_database_info, stream=False, validate_query=None):
+        """Build the chat completion payload for a medicine"""
+        prompt = build_prompt(str(brand), str(generic), str(manufacturer), has_database_info, validate_query or '')
+        
+        payload = {
+            "model": self.model,
+            "messages": [
+                SYSTEM_MESSAGE,
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "response_format": {"type": "json_object"},
+            "stream": stream,
+            "temperature": 0.7,
+            "max_tokens": 1200  # Increased for comprehensive responses
+        }
+        
+        return payload
+    
+    def _parse_response(self, explanation_text):
+        """
+        Parse the completion text into the structured explanation
+        Returns None for unsafe or unparseable responses
+        """
+        explanation_text = explanation_text.strip()
+        log.debug("✅ API response received (%d chars)", len(explanation_text))
+        
+        # response_format asks for bare JSON, so this normally parses directly
+        structured_data = parse_explanation(explanation_text)
+        if structured_data is None:
+            log.warning("⚠️ Could not parse JSON response, using fallback. Raw response (first 500 chars): %s...", explanation_text[:500])
+            return None
+        
+        # Check only the text shown to users, not JSON keys and punctuation
+        if self.contains_medical_advice(explanation_fields_text(structured_data)):
+            log.warning("⚠️ Medical advice detected, using safe fallback")
+            return None
         
-        # Fallback only if API fails
-        print("⚠️ Using fallback explanation")
-        return self.generate_fallback_explanation_structured(medicine_data)
+        log.debug("✅ Successfully parsed structured JSON response")
+        return structured_data
     
     def generate_fallback_explanation_structured(self, medicine_data):
         """
@@ -272,55 +517,59 @@ CRITICAL INSTRUCTIONS:
         generic = medicine_data.get('generic_name', 'N/A')
         manufacturer = medicine_data.get('manufacturer', 'N/A')
         
+        # Outages hammer this path, so render each medicine's text once and hand out copies
+        cached = self._fallback_cached(brand, generic, manufacturer)
+        # is_fallback lets callers avoid caching an outage response as if it were real
+        return {**cached, 'side_effects': list(cached['side_effects']), 'is_fallback': True}
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def _fallback_cached(brand, generic, manufacturer):
+        """Render the fallback explanation for one medicine (shared, do not mutate)"""
         # Check if we have database data
         has_data = manufacturer != 'N/A'
         
         if has_data:
             # Medicine found in Pakistan database - provide detailed info
-            generic_info = f" The active ingredient is {generic}." if generic != 'N/A' else ""
+            has_generic = generic != 'N/A'
             return {
-                "description": f"{brand} is a registered pharmaceutical product in Pakistan, manufactured by {manufacturer}.{generic_info} This medicine has been officially approved for distribution in Pakistan by the Drug Regulatory Authority of Pakistan (DRAP). It undergoes quality control and meets local pharmaceutical standards. For complete medical information including detailed composition, therapeutic indications, mechanism of action, and usage guidelines, please refer to the official package insert or consult with a licensed pharmacist or healthcare provider.",
-                
-                "uses": f"As a registered medicine in Pakistan's pharmaceutical database, {brand} has approved therapeutic indications. The specific medical uses, conditions it treats, and therapeutic applications are detailed in the official prescribing information. Common uses for medicines in this category typically include treatment of specific medical conditions based on the active ingredient{f' ({generic})' if generic != 'N/A' else ''}. For accurate information about approved indications, recommended patient populations, and proper therapeutic use, please consult the package insert, speak with your pharmacist, or contact your healthcare provider.",
-                
-                "side_effects": [
-                    f"Common side effects: Like all medications, {brand} may cause side effects in some patients. The frequency and severity vary by individual",
-                    "Mild reactions: May include nausea, headache, dizziness, stomach upset, or drowsiness depending on the medication class",
-                    "Allergic reactions: Watch for signs of allergic reactions including skin rash, itching, swelling, or difficulty breathing",
-                    "Serious effects: Stop use and seek immediate medical attention if you experience severe reactions, unusual symptoms, or signs of overdose",
-                    "Individual variation: Not everyone experiences side effects - many people use this medicine with minimal issues",
-                    "Complete information: Check the official package insert for a comprehensive list of potential side effects and their frequencies",
-                    "Report symptoms: Always inform your healthcare provider about any unusual or persistent symptoms"
-                ],
-                
-                "warnings": f"⚠️ IMPORTANT SAFETY INFORMATION FOR {brand}: This medicine is a regulated pharmaceutical product in Pakistan. GENERAL PRECAUTIONS: Always read the complete package insert before first use. Follow the prescribed dosage and duration exactly as directed by your healthcare provider. SPECIAL POPULATIONS: Consult your doctor before use if you are pregnant, planning pregnancy, breastfeeding, elderly, or treating children. MEDICAL CONDITIONS: Inform your doctor about all existing medical conditions, especially liver disease, kidney disease, heart conditions, diabetes, or blood disorders. DRUG INTERACTIONS: Tell your healthcare provider about all medications, supplements, and herbal products you are currently taking to avoid potential interactions. ALLERGIES: Do not use if you have known allergies to {generic if generic != 'N/A' else 'any ingredients in this medicine'}. STORAGE: Keep out of reach of children. Store as directed on the package (usually at room temperature, away from moisture and heat). OVERDOSE: In case of overdose or severe reaction, seek immediate medical attention or contact emergency services. PURCHASE: Only buy from licensed, authorized pharmacies to ensure product authenticity and quality. DISPOSAL: Dispose of expired or unused medication properly - return to pharmacy or follow local disposal guidelines."
-            }
-        else:
-            # Medicine NOT in Pakistan database - provide helpful info without mentioning database
-            return {
-                "description": f"{brand} is a pharmaceutical medication. Based on common medical knowledge and the medicine name, this appears to be a recognized pharmaceutical product used for therapeutic purposes. The specific formulation, active ingredients, and approved uses may vary by region and manufacturer. For detailed information about the exact formulation available in your area, consulting with a registered pharmacist or healthcare provider is recommended.",
-                
-                "uses": f"{brand} is typically used for specific therapeutic purposes based on its active ingredient and drug classification. Common medical applications may include treatment of particular health conditions, symptom management, or disease control. The appropriate use depends on individual patient factors, medical history, and current health status. Your healthcare provider can determine if this medication is suitable for your specific condition and provide guidance on proper therapeutic applications.",
-                
-                "side_effects": [
-                    "Possible mild effects may include nausea, headache, or dizziness in some users",
-                    "Drowsiness or fatigue can occur - avoid driving if affected",
-                    "Stomach discomfort or digestive issues may be experienced",
-                    "Allergic reactions possible - watch for skin rash, itching, or swelling",
-                    "Some individuals may experience changes in appetite or sleep patterns",
-                    "Serious side effects are uncommon but require immediate medical attention",
-                    "Individual responses vary - consult your doctor if any symptoms persist"
-                ],
-                
-                "warnings": f"Important safety information for {brand}: Consult your healthcare provider before use, especially if you are pregnant, breastfeeding, have existing medical conditions, or take other medications. Follow the prescribed or recommended dosage carefully. Do not exceed the recommended duration of use without medical supervision. Keep out of reach of children. Store at room temperature away from moisture and heat. Seek immediate medical attention if you experience severe reactions or symptoms worsen. Only purchase from licensed, authorized pharmacies to ensure product quality and authenticity."
+                "description": _FALLBACK_DESCRIPTION_HAS_DATA.format(
+                    brand=brand,
+                    manufacturer=manufacturer,
+                    generic_info=f" The active ingredient is {generic}." if has_generic else ""
+                ),
+                "uses": _FALLBACK_USES_HAS_DATA.format(
+                    brand=brand,
+                    generic_suffix=f" ({generic})" if has_generic else ""
+                ),
+                "side_effects": [_FALLBACK_FIRST_SIDE_EFFECT_HAS_DATA.format(brand=brand), *_FALLBACK_SIDE_EFFECTS_HAS_DATA],
+                "warnings": _FALLBACK_WARNINGS_HAS_DATA.format(
+                    brand=brand,
+                    allergen=generic if has_generic else 'any ingredients in this medicine'
+                )
             }
         
-        
+        # Medicine NOT in Pakistan database - provide helpful info without mentioning database
+        return {
+            "description": _FALLBACK_DESCRIPTION_NO_DATA.format(brand=brand),
+            "uses": _FALLBACK_USES_NO_DATA.format(brand=brand),
+            "side_effects": list(_FALLBACK_SIDE_EFFECTS_NO_DATA),
+            "warnings": _FALLBACK_WARNINGS_NO_DATA.format(brand=brand)
+        }
     
     def is_available(self):
-        """Check if API is available"""
+        """Check if API is available (cached for 60 seconds)"""
+        if self._avail_cache is not None and time.monotonic() - self._avail_cache[0] < 60:
+            return self._avail_cache[1]
+        
         try:
-            response = requests.get(self.api_url.replace('/chat/completions', '/models'), timeout=5)
-            return response.status_code == 200
+            response = self.client.head(self.api_url.replace('/chat/completions', '/models'), timeout=5)
+            available = response.status_code == 200
         except:
-            return False
+            available = False
+        self._avail_cache = (time.monotonic(), available)
+        return available
+    
+    def _mark_available(self):
+        """Record a successful API call so health checks are free during traffic"""
+        self._avail_cache = (time.monotonic(), True)
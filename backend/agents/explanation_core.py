@@ -0,0 +1,189 @@
+"""
+Pure helpers for ExplanationAgent: prompt building, safety checks and response parsing
+
+Nothing here does I/O, so the module can be compiled in place with mypyc
+(`mypyc agents/explanation_core.py`) and is imported the same way either way.
+"""
+import json
+import re
+import string
+from typing import Any, Dict, Optional
+
+from json_repair import repair_json
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def json_loads(data: Any) -> Any:
+    """Parse JSON from str or bytes"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+# Phrases that indicate dosage instructions or prescriptive advice
+UNSAFE_PATTERNS = (
+    r'\btake\s+\d+',  # "take 2 tablets"
+    r'\bdosage\s+is\s+\d+',  # "dosage is 500mg"
+    r'you\s+should\s+take',
+    r'recommended\s+dose\s+is',
+    r'\d+\s*mg\s+every',  # "500mg every 6 hours"
+    r'take\s+this\s+medicine',
+    r'consume\s+\d+',
+    r'administer\s+\d+',
+)
+# One alternation so a response is scanned once instead of once per pattern
+UNSAFE_RE = re.compile("|".join(f"(?:{p})" for p in UNSAFE_PATTERNS), re.IGNORECASE)
+
+# A trailing strength like "500 mg" doesn't change the explanation. The unit is required:
+# bare numbers are part of names such as "vitamin b 12", "omega 3" or "insulin 70/30"
+_STRENGTH_SUFFIX_RE = re.compile(r'\s+\d+(?:\.\d+)?\s*(?:mg|mcg|g|ml|iu)$')
+_WHITESPACE_RE = re.compile(r'\s+')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+REQUIRED_FIELDS = ('description', 'uses', 'side_effects', 'warnings')
+
+SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a medical information assistant. Return ONLY valid JSON. No markdown, no code blocks, no explanations. Just pure JSON."
+}
+
+# Prompts are built once; only the medicine fields are substituted per call
+PROMPT_DB_TMPL = string.Template("""You are a Medicine Information Assistant for Pakistan. Provide comprehensive information about ${brand}.
+
+Medicine: ${brand}
+Manufacturer: ${manufacturer}
+Generic: ${generic}
+
+Return ONLY a JSON object with this exact structure (no markdown, no code blocks):
+{
+  "description": "Comprehensive overview (3-4 sentences): What this medicine is, its active ingredients, drug class, and primary medical purpose. Be informative and educational.",
+  "uses": "Detailed medical uses and conditions it treats. Include: primary indications, therapeutic applications, and what symptoms/conditions it addresses. Use clear, patient-friendly language.",
+  "side_effects": ["Common side effect 1 with brief description", "Common side effect 2 with brief description", "Common side effect 3 with brief description", "Rare but serious side effect to watch for"],
+  "warnings": "Important safety information including: who should avoid it, drug interactions to be aware of, contraindications, special precautions for pregnant/breastfeeding women, and when to seek immediate medical attention."
+}
+
+CRITICAL RULES:
+- Be comprehensive and educational (this is for patient awareness)
+- side_effects MUST be an array of 4-6 strings with brief descriptions
+- Include both common and serious side effects
+- Do NOT include dosage recommendations or instructions
+- Do NOT say "take this medicine" or give prescriptive medical advice
+- Focus on educational awareness and safety information
+- Use professional medical terminology but explain it clearly
+- Keep each section informative but concise""")
+
+PROMPT_NODB_TMPL = string.Template("""You are a Medicine Information Assistant with comprehensive pharmaceutical knowledge. The medicine '${brand}' is NOT in our Pakistan database, but you should use your general medical knowledge to provide helpful information.
+
+IMPORTANT: Use your training data and medical knowledge to provide actual information about ${brand} if you recognize it as a real medicine. Only say "not available" if you truly don't know this medicine.
+
+Return ONLY a JSON object with this exact structure (no markdown, no code blocks):
+{
+  "description": "If you recognize ${brand}: Provide a comprehensive 3-4 sentence overview explaining what this medicine is, its active ingredient(s), drug classification, and primary therapeutic purpose. Be specific and informative. If truly unknown: State it's not in database and may be spelled differently or be a regional brand name.",
+  "uses": "If you know ${brand}: Provide detailed therapeutic uses, medical conditions it treats, primary indications, and what symptoms it addresses. Include specific conditions and use cases. If truly unknown: 'This specific brand is not in our database. Please verify the medicine name spelling or consult a pharmacist for information.'",
+  "side_effects": ["If you know ${brand}: List 4-6 actual common and serious side effects based on the drug class/active ingredient", "Include both frequent mild effects and rare serious effects", "Be specific - not generic statements", "If truly unknown: 'Side effect information unavailable - verify medicine name and consult healthcare provider'"],
+  "warnings": "If you know ${brand}: Provide comprehensive safety warnings including contraindications, drug interactions, pregnancy/breastfeeding warnings, and special precautions based on the drug class. If truly unknown: 'This medicine is not in our Pakistan database. Verify the spelling and brand name. DO NOT use any medicine without consulting a qualified healthcare professional. Always check official regulatory approval and purchase only from licensed pharmacies.'"
+}
+
+CRITICAL INSTRUCTIONS:
+- ACTIVELY USE your medical knowledge - don't default to "not available" if you know the medicine
+- If ${brand} is a common medicine (even if not in Pakistan database), provide full information
+- Be helpful and informative while maintaining safety focus
+- Only use "not available" responses if you genuinely don't recognize the medicine
+- Patient safety is paramount but so is providing useful information when you can""")
+
+
+# Appended when the user's query still has to be validated, so one call both checks and explains
+VALIDATION_ADDENDUM_TMPL = string.Template("""
+
+ALSO decide whether the user's original query is about a medicine, medical condition, or healthcare product.
+User query: "${query}"
+Add an "is_medicine" field to the JSON object:
+- "YES" if it's about medicine names, symptoms/conditions, medical products or healthcare questions related to medicines
+- "NO" if it's a greeting, a general question (weather, time, jokes) or any non-medical topic
+If "is_medicine" is "NO", leave the other fields as empty strings.""")
+
+
+def normalize_brand(brand: str) -> str:
+    """Lowercase, collapse whitespace and drop a trailing strength for cache keys"""
+    normalized = _WHITESPACE_RE.sub(' ', brand.strip().lower())
+    return _STRENGTH_SUFFIX_RE.sub('', normalized) or normalized
+
+
+def brand_numbers(brand: str) -> tuple:
+    """Numbers left in a normalized brand; names that differ in them are different products"""
+    return tuple(_NUMBER_RE.findall(brand))
+
+
+def find_medical_advice(text: str) -> Optional[str]:
+    """Return the first unsafe advice phrase in text, or None"""
+    match = UNSAFE_RE.search(text)
+    return match.group(0) if match else None
+
+
+def explanation_fields_text(data: Dict[str, Any]) -> str:
+    """Join the natural-language fields of a parsed explanation for safety scanning"""
+    side_effects = data.get('side_effects')
+    if not isinstance(side_effects, list):
+        side_effects = [side_effects]
+    parts = [data.get('description'), data.get('uses'), data.get('warnings')] + side_effects
+    return " ".join(str(part) for part in parts if part is not None)
+
+
+def build_prompt(brand: str, generic: str, manufacturer: str, has_database_info: bool,
+                 validate_query: str = '') -> str:
+    """Render the user prompt for a medicine, optionally asking for a validation verdict too"""
+    if has_database_info:
+        prompt = PROMPT_DB_TMPL.substitute(
+            brand=brand,
+            manufacturer=manufacturer,
+            generic=generic if generic != 'N/A' else 'Not specified'
+        )
+    else:
+        prompt = PROMPT_NODB_TMPL.substitute(brand=brand)
+    if validate_query:
+        prompt += VALIDATION_ADDENDUM_TMPL.substitute(query=validate_query)
+    return prompt
+
+
+def parse_explanation(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse model output into the structured explanation dict
+    Returns None when no JSON object can be recovered
+    """
+    try:
+        data = json_loads(text)
+    except ValueError:
+        # Models that ignore response_format may still add code fences, prose or trailing commas
+        try:
+            data = json_loads(repair_json(text))
+        except ValueError:
+            return None
+    
+    if not isinstance(data, dict):
+        return None
+    
+    # Ensure side_effects is a list
+    if 'side_effects' in data and not isinstance(data.get('side_effects'), list):
+        data['side_effects'] = [str(data.get('side_effects', 'Information not available'))]
+    
+    # Ensure all required fields exist
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            data[field] = 'Information not available'
+    
+    # Validation verdict becomes a bool; anything but an explicit NO keeps the request open
+    if 'is_medicine' in data and not isinstance(data['is_medicine'], bool):
+        data['is_medicine'] = 'NO' not in str(data['is_medicine']).upper()
+    return data
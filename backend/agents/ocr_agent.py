@@ -1,9 +1,103 @@
 import os
-import re
 import io
 import base64
-import requests
-from PIL import Image, ImageEnhance, ImageStat
+import json
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed, wait
+from PIL import Image
+
+from .ocr_core import tokenize, is_medicine_related, extract_medicine_name
+
+try:
+    import numpy as np
+except ImportError:  # fall back to the PIL enhancers
+    np = None
+
+try:
+    from numba import njit, prange
+except ImportError:  # fall back to the NumPy pipeline
+    njit = None
+
+_JPEG_DATA_URL_PREFIX = 'data:image/jpeg;base64,'
+
+# Every gunicorn request thread can have a primary vision call in flight, plus at most one hedge
+REQUEST_THREADS = int(os.getenv('GUNICORN_THREADS', 32))
+
+
+class _VisionCall:
+    """Handle on one in-flight vision request so the losing side of a hedge can be abandoned"""
+    
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.response = None
+    
+    def cancel(self):
+        self.cancelled.set()
+        response = self.response
+        if response is not None:
+            # Drops the connection, so a body still downloading stops at the next chunk
+            response.close()
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, parallel=True, nogil=True)
+    def _enhance_kernel(arr, contrast, brightness, mean, sharpness):
+        """Compiled _enhance_gray maths over a uint8 array, rows split across threads"""
+        h, w = arr.shape
+        scale = contrast * brightness
+        bias = mean * brightness
+        x = np.empty((h, w), dtype=np.float32)
+        for i in prange(h):
+            for j in range(w):
+                v = (arr[i, j] - mean) * scale + bias
+                x[i, j] = round(min(max(v, 0.0), 255.0))
+        
+        out = np.empty((h, w), dtype=np.uint8)
+        for i in prange(h):
+            up = max(i - 1, 0)
+            down = min(i + 1, h - 1)
+            for j in range(w):
+                left = max(j - 1, 0)
+                right = min(j + 1, w - 1)
+                smooth = (
+                    x[up, left] + x[up, j] + x[up, right] +
+                    x[i, left] + 5 * x[i, j] + x[i, right] +
+                    x[down, left] + x[down, j] + x[down, right]
+                ) / 13
+                v = sharpness * x[i, j] + (1 - sharpness) * smooth
+                out[i, j] = np.uint8(min(max(v, 0.0), 255.0))
+        return out
+else:
+    _enhance_kernel = None
+
+
+def _enhance_gray(image, contrast, brightness, sharpness=2.0):
+    """
+    Contrast, brightness and sharpness for an 'L' image in one NumPy pipeline
+    Same maths as the PIL ImageEnhance chain without an Image copy per step
+    """
+    if _enhance_kernel is not None:
+        arr = np.asarray(image, dtype=np.uint8)
+        mean = float(int(arr.mean() + 0.5))
+        return Image.fromarray(_enhance_kernel(arr, contrast, brightness, mean, sharpness), mode='L')
+    
+    x = np.asarray(image, dtype=np.float32)
+    mean = float(int(x.mean() + 0.5))
+    # Contrast blends toward the mean grey; brightness >= 1 commutes with the clip
+    x = (x - mean) * (contrast * brightness) + mean * brightness
+    np.clip(x, 0, 255, out=x)
+    np.rint(x, out=x)
+    
+    # Sharpness blends away from PIL's 3x3 SMOOTH kernel: out = s*x + (1-s)*smooth
+    p = np.pad(x, 1, mode='edge')
+    smooth = (
+        p[:-2, :-2] + p[:-2, 1:-1] + p[:-2, 2:] +
+        p[1:-1, :-2] + 5 * p[1:-1, 1:-1] + p[1:-1, 2:] +
+        p[2:, :-2] + p[2:, 1:-1] + p[2:, 2:]
+    ) / 13
+    out = sharpness * x + (1 - sharpness) * smooth
+    np.clip(out, 0, 255, out=out)
+    return Image.fromarray(out.astype(np.uint8), mode='L')
 
 
 class OCRAgent:
@@ -31,25 +125,59 @@ class OCRAgent:
             "X-Title": "AI-LTH Medicine OCR"
         }
         
+        # Keep-alive session so images after the first skip the TLS handshake,
+        # created on first use so requests is only imported when OCR actually runs
+        self._session = None
+        
+        # Hedged requests: start the alternative model if the primary is slow to answer.
+        # The pool fits one primary per request thread plus one hedge each, and hedges
+        # are only started while a slot is free, so no call ever waits in the pool's queue
+        self.hedge_delay = 2.0
+        self.executor = ThreadPoolExecutor(max_workers=2 * REQUEST_THREADS, thread_name_prefix='vision')
+        self._hedge_slots = threading.BoundedSemaphore(REQUEST_THREADS)
+        
         # Set API as available
         self.vision_available = True
         print("✅ OpenRouter GPT-4o-mini Vision API configured!")
-        
-        # Dynamic medicine detection patterns (compiled regex for performance)
-        self.medicine_patterns = [
-            re.compile(r'\b\d+\s*(mg|ml|mcg|g|ml|L|IU|units?)\b', re.IGNORECASE),  # Dosage
-            re.compile(r'\b(tablet|capsule|syrup|injection|cream|ointment|gel|drops|suspension|solution|powder|spray|inhaler|patch)\b', re.IGNORECASE),  # Form
-            re.compile(r'\b(oral|topical|intravenous|intramuscular|subcutaneous|transdermal)\b', re.IGNORECASE),  # Route
-            re.compile(r'\b(expiry|exp\.?|mfg\.?|batch|lot)\s*:?\s*\d+', re.IGNORECASE),  # Package info
-            re.compile(r'\b(pharmaceutical|pharma|medicine|medication|drug|rx|℞)\b', re.IGNORECASE),  # Medical terms
-            re.compile(r'\b(paracetamol|aspirin|ibuprofen|amoxicillin|metformin|omeprazole)\b', re.IGNORECASE),  # Common drugs
-        ]
+
+    @property
+    def session(self):
+        """HTTP session for the vision API, built on first use"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=2 * REQUEST_THREADS))
+            self._session = session
+        return self._session
 
     def preprocess_image(self, image: Image.Image) -> Image.Image:
         """Preprocess image for better OCR results with multiple enhancement techniques."""
+        from PIL import ImageEnhance, ImageStat
+        
         try:
-            # Resize if too small (OCR works better with larger images)
+            # Vision models tile images down internally, so huge phone photos only cost upload time
+            max_dim = 1536
+            if max(image.width, image.height) > max_dim:
+                ratio = max_dim / max(image.width, image.height)
+                new_size = (max(1, int(image.width * ratio)), max(1, int(image.height * ratio)))
+                image = image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                print(f"📐 Downscaled image to {new_size} for faster upload")
+            
+            # Brightness and contrast statistics from a thumbnail are close enough and far cheaper
+            source = image.convert('L') if image.mode in ('1', 'P') else image
+            thumb = source.resize((128, 128), Image.Resampling.BOX)
+            stat = ImageStat.Stat(thumb.convert('L'))
+            mean_brightness = stat.mean[0]
+            
+            # Already large, well-lit and contrasty photos are sent as they are
             min_width = 600
+            if image.width >= min_width and 80 < mean_brightness < 200 and stat.stddev[0] > 40:
+                print("✨ Image already clear, skipping enhancement")
+                return image
+            
+            # Resize if too small (OCR works better with larger images)
             if image.width < min_width:
                 ratio = min_width / image.width
                 new_size = (int(image.width * ratio), int(image.height * ratio))
@@ -60,9 +188,6 @@ class OCRAgent:
             image = image.convert('L')
             
             # Dynamic contrast enhancement
-            stat = ImageStat.Stat(image)
-            mean_brightness = stat.mean[0]
-            
             # More aggressive enhancement for better text detection
             if mean_brightness < 100:
                 contrast_factor = 2.5
@@ -71,17 +196,23 @@ class OCRAgent:
             else:
                 contrast_factor = 1.7
             
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(contrast_factor)
-            
             # Brightness adjustment if too dark
-            if mean_brightness < 80:
-                brightness_enhancer = ImageEnhance.Brightness(image)
-                image = brightness_enhancer.enhance(1.5)
+            brightness_factor = 1.5 if mean_brightness < 80 else 1.0
             
-            # Sharpness enhancement for clearer text
-            sharpness_enhancer = ImageEnhance.Sharpness(image)
-            image = sharpness_enhancer.enhance(2.0)
+            if np is not None:
+                # Contrast, brightness and sharpening fused into one array pipeline
+                image = _enhance_gray(image, contrast_factor, brightness_factor)
+            else:
+                enhancer = ImageEnhance.Contrast(image)
+                image = enhancer.enhance(contrast_factor)
+                
+                if brightness_factor != 1.0:
+                    brightness_enhancer = ImageEnhance.Brightness(image)
+                    image = brightness_enhancer.enhance(brightness_factor)
+                
+                # Sharpness enhancement for clearer text
+                sharpness_enhancer = ImageEnhance.Sharpness(image)
+                image = sharpness_enhancer.enhance(2.0)
         except Exception as e:
             print(f"⚠️ Preprocessing failed: {e}, using original image")
             return image
@@ -90,132 +221,11 @@ class OCRAgent:
 
     def _is_medicine_related(self, text: str) -> tuple[bool, float, list]:
         """Dynamic medicine detection using pattern matching."""
-        if not text or len(text.strip()) < 10:
-            return False, 0.0, []
-        
-        detected_patterns = []
-        pattern_weights = {
-            0: 0.25,  # Dosage
-            1: 0.20,  # Form
-            2: 0.15,  # Route
-            3: 0.15,  # Package info
-            4: 0.15,  # Medical terms
-            5: 0.10,  # Drug names
-        }
-        
-        confidence = 0.0
-        for idx, pattern in enumerate(self.medicine_patterns):
-            matches = pattern.findall(text)
-            if matches:
-                detected_patterns.append({
-                    'type': ['dosage', 'form', 'route', 'package', 'medical', 'drug_name'][idx],
-                    'matches': matches[:3],
-                    'weight': pattern_weights[idx]
-                })
-                confidence += pattern_weights[idx]
-        
-        is_medicine = confidence >= 0.3
-        return is_medicine, min(confidence, 1.0), detected_patterns
+        return is_medicine_related(text)
     
-    def _extract_medicine_name(self, raw_text: str, lines: list) -> str:
+    def _extract_medicine_name(self, raw_text: str, lines: list, all_words: list = None) -> str:
         """Enhanced medicine name extraction with better cleaning logic."""
-        # Words to filter out (common non-medicine words)
-        filter_words = {
-            'tablet', 'tablets', 'capsule', 'capsules', 'syrup', 'injection', 
-            'cream', 'ointment', 'gel', 'drops', 'suspension', 'solution',
-            'powder', 'spray', 'inhaler', 'patch', 'mg', 'ml', 'mcg', 'gm',
-            'each', 'pack', 'strip', 'box', 'bottle', 'contains', 'composition',
-            'expiry', 'exp', 'mfg', 'batch', 'lot', 'date', 'pharmaceutical',
-            'pharma', 'pvt', 'ltd', 'limited', 'pakistan', 'india', 'usa',
-            'made', 'manufactured', 'by', 'company', 'laboratories', 'lab',
-            'prescription', 'only', 'medicine', 'drug', 'store', 'between',
-            'keep', 'out', 'reach', 'children', 'doctor', 'pharmacist'
-        }
-        
-        medicine_name = ''
-        
-        # Strategy 1: Look for brand name patterns (usually CAPITALIZED or Title Case in first few lines)
-        for i, line in enumerate(lines[:5]):  # Check first 5 lines
-            line_clean = line.strip()
-            if not line_clean or len(line_clean) < 2:
-                continue
-            
-            # Skip lines that are purely dosage info
-            if re.match(r'^\d+\s*(mg|ml|mcg|g|%)', line_clean, re.IGNORECASE):
-                continue
-            
-            # Skip manufacturer lines
-            if any(word in line_clean.lower() for word in ['pvt', 'ltd', 'limited', 'laboratories', 'pharma']):
-                continue
-            
-            # Medicine names are often in first 1-2 lines and have capital letters
-            has_caps = bool(re.search(r'[A-Z]', line_clean))
-            
-            if has_caps or i < 2:  # First 2 lines or lines with capitals
-                # Clean the line
-                cleaned = line_clean
-                
-                # Remove dosage information
-                cleaned = re.sub(r'\d+\.?\d*\s*(mg|ml|mcg|g|gm|gram|%|iu|unit)', '', cleaned, flags=re.IGNORECASE)
-                
-                # Remove packaging info
-                cleaned = re.sub(r'\d+\s*[x×]\s*\d+', '', cleaned)  # "1x10", "2×20"
-                cleaned = re.sub(r'\d+[\'s]*$', '', cleaned)  # "10's", "20s" at end
-                
-                # Remove special characters but keep spaces, hyphens, slashes, ampersands
-                cleaned = re.sub(r'[^\w\s\-\/\&\+]', ' ', cleaned)
-                
-                # Remove standalone numbers
-                cleaned = re.sub(r'\b\d+\b', '', cleaned)
-                
-                # Split into words and filter
-                words = cleaned.split()
-                filtered_words = [
-                    word for word in words 
-                    if word.lower() not in filter_words 
-                    and len(word) > 1
-                    and not word.isdigit()
-                ]
-                
-                # Reconstruct name
-                potential_name = ' '.join(filtered_words).strip()
-                
-                # If we got a good name (2-30 chars), use it
-                if 2 <= len(potential_name) <= 30 and potential_name:
-                    medicine_name = potential_name
-                    print(f"🎯 Found medicine name in line {i+1}: '{medicine_name}'")
-                    break
-        
-        # Strategy 2: If no name found, look for the longest meaningful word sequence
-        if not medicine_name:
-            all_words = raw_text.split()
-            filtered = [
-                w for w in all_words 
-                if len(w) > 2 
-                and not w.isdigit() 
-                and w.lower() not in filter_words
-                and not re.match(r'^\d+[a-z]*$', w.lower())  # "500mg", "10ml"
-            ]
-            
-            if filtered:
-                # Take first 1-3 meaningful words as medicine name
-                medicine_name = ' '.join(filtered[:3])
-                print(f"📝 Extracted from keywords: '{medicine_name}'")
-        
-        # Strategy 3: Fallback to first line if still nothing
-        if not medicine_name and lines:
-            first_line = lines[0]
-            # Basic cleaning
-            cleaned = re.sub(r'[^\w\s\-]', ' ', first_line)
-            cleaned = re.sub(r'\b\d+\b', '', cleaned)
-            cleaned = ' '.join(cleaned.split())
-            medicine_name = cleaned[:50]  # Limit length
-            print(f"⚠️ Fallback to first line: '{medicine_name}'")
-        
-        # Final cleanup: remove extra spaces
-        medicine_name = ' '.join(medicine_name.split())
-        
-        return medicine_name
+        return extract_medicine_name(raw_text, lines, all_words)
     
     def _load_image(self, image_file):
         """Load an image from various sources."""
@@ -239,6 +249,79 @@ class OCRAgent:
 
         raise ValueError('Unsupported image input type for OCRAgent')
 
+    def _post_vision(self, payload, call=None):
+        """Send one vision request, returns the extracted text or raises on failure (or cancellation)"""
+        response = self.session.post(self.api_url, json=payload, timeout=30, stream=True)
+        try:
+            if call is not None:
+                call.response = response
+                if call.cancelled.is_set():
+                    raise CancelledError(f"{payload['model']} superseded")
+            if response.status_code != 200:
+                error_msg = response.text[:500] if response.text else "No error details"
+                raise Exception(f"{payload['model']} returned {response.status_code}: {error_msg}")
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=16384):
+                if call is not None and call.cancelled.is_set():
+                    raise CancelledError(f"{payload['model']} superseded")
+                body.extend(chunk)
+            return json.loads(body)['choices'][0]['message']['content']
+        finally:
+            # Returns a fully read connection to the pool, discards an abandoned one
+            response.close()
+    
+    def _start_hedge(self, payload):
+        """Start the alternative model if a hedge slot is free, else None"""
+        if not self._hedge_slots.acquire(blocking=False):
+            return None, None
+        call = _VisionCall()
+        future = self.executor.submit(self._post_vision, {**payload, 'model': self.alternative_model}, call)
+        future.add_done_callback(lambda _: self._hedge_slots.release())
+        return future, call
+    
+    def _dispatch_vision(self, payload):
+        """Query the primary model, racing the alternative model if it is slow or fails"""
+        primary_call = _VisionCall()
+        primary = self.executor.submit(self._post_vision, payload, primary_call)
+        done, _ = wait([primary], timeout=self.hedge_delay)
+        if done and primary.exception() is None:
+            raw_text = primary.result()
+            print(f"📋 Vision model extracted: {raw_text[:150]}...")
+            return raw_text
+        
+        if done:
+            print(f"❌ Primary vision model failed: {primary.exception()}")
+        else:
+            print(f"⏳ Primary vision model slow after {self.hedge_delay}s")
+        
+        alternative, alternative_call = self._start_hedge(payload)
+        if alternative is None:
+            # Every hedge slot is busy: hedging now would only queue, so wait on the primary
+            print("⏳ No capacity to hedge, waiting for the primary vision model")
+            raw_text = primary.result()
+            print(f"📋 Vision model extracted: {raw_text[:150]}...")
+            return raw_text
+        print(f"🔄 Trying alternative vision model: {self.alternative_model}")
+        
+        # First successful answer wins and the other call is abandoned
+        calls = {primary: primary_call, alternative: alternative_call}
+        errors = []
+        for future in as_completed(calls):
+            try:
+                raw_text = future.result()
+            except Exception as e:
+                errors.append(str(e))
+                continue
+            for other, other_call in calls.items():
+                if other is not future:
+                    other.cancel()
+                    other_call.cancel()
+            source = 'Alternative model' if future is alternative else 'Vision model'
+            print(f"📋 {source} extracted: {raw_text[:150]}...")
+            return raw_text
+        
+        raise Exception(f"Both vision models failed: {'; '.join(errors)}")
+    
     def extract_text(self, image_file):
         """Extract text from medicine packaging image using OpenRouter Gemini Vision API.
 
@@ -252,10 +335,14 @@ class OCRAgent:
                 print("🚀 Using OpenRouter Gemini 2.0 Flash Vision API (cloud-based & free)...")
                 processed_image = self.preprocess_image(image)
                 
-                # Convert image to base64 for OpenRouter API
+                # Encode once as JPEG for both model attempts; far smaller to upload than PNG
+                if processed_image.mode not in ('L', 'RGB'):
+                    processed_image = processed_image.convert('RGB')
                 img_byte_arr = io.BytesIO()
-                processed_image.save(img_byte_arr, format='PNG')
-                img_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+                processed_image.save(img_byte_arr, format='JPEG', quality=85)
+                # getbuffer() is a zero-copy view; base64 output is pure ASCII
+                data_url = _JPEG_DATA_URL_PREFIX + base64.b64encode(img_byte_arr.getbuffer()).decode('ascii')
+                del img_byte_arr
                 
                 # Create vision API request
                 payload = {
@@ -274,7 +361,7 @@ class OCRAgent:
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:image/png;base64,{img_base64}"
+                                        "url": data_url
                                     }
                                 }
                             ]
@@ -286,42 +373,7 @@ class OCRAgent:
                 
                 # Try OpenRouter API call
                 try:
-                    response = requests.post(
-                        self.api_url,
-                        headers=self.headers,
-                        json=payload,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        result = response.json()
-                        raw_text = result['choices'][0]['message']['content']
-                        print(f"📋 Gemini Vision extracted: {raw_text[:150]}...")
-                    
-                    else:
-                        error_msg = response.text[:500] if response.text else "No error details"
-                        print(f"❌ OpenRouter Gemini API error: {response.status_code}")
-                        print(f"📄 Error details: {error_msg}")
-                        
-                        # Try alternative model (GPT-4o-mini)
-                        print(f"🔄 Trying alternative vision model: {self.alternative_model}")
-                        payload['model'] = self.alternative_model
-                        
-                        alt_response = requests.post(
-                            self.api_url,
-                            headers=self.headers,
-                            json=payload,
-                            timeout=30
-                        )
-                        
-                        if alt_response.status_code == 200:
-                            result = alt_response.json()
-                            raw_text = result['choices'][0]['message']['content']
-                            print(f"📋 Alternative model extracted: {raw_text[:150]}...")
-                        else:
-                            print(f"❌ Alternative model also failed: {alt_response.status_code}")
-                            raise Exception(f"Both vision models failed")
-                
+                    raw_text = self._dispatch_vision(payload)
                 except Exception as api_error:
                     print(f"❌ OpenRouter Vision API failed: {api_error}")
                     print("❌ Using MOCK mode")
@@ -336,12 +388,13 @@ class OCRAgent:
                 }
 
                 # Analyze extracted text
-                lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
+                lines, all_words = tokenize(raw_text)
+                stripped_len = len(raw_text.strip())
                 is_medicine, pattern_confidence, detected_patterns = self._is_medicine_related(raw_text)
                 
                 # If text is too short, OCR likely failed
-                if len(raw_text.strip()) < 10:
-                    print(f"⚠️ OCR extracted very little text ({len(raw_text.strip())} chars)")
+                if stripped_len < 10:
+                    print(f"⚠️ OCR extracted very little text ({stripped_len} chars)")
                     is_medicine = False
                     pattern_confidence = 0.0
                     detected_patterns = []
@@ -358,8 +411,8 @@ class OCRAgent:
                 confidence = pattern_confidence
                 
                 # Only extract medicine name if we have text
-                if len(raw_text.strip()) >= 10:
-                    medicine_name = self._extract_medicine_name(raw_text, lines)
+                if stripped_len >= 10:
+                    medicine_name = self._extract_medicine_name(raw_text, lines, all_words)
                 
                 print(f"💊 Extracted medicine name: '{medicine_name}'")
 
@@ -0,0 +1,201 @@
+"""
+Pure text helpers for OCRAgent: tokenizing, medicine detection and name extraction
+
+No network or image work happens here, so the module can be compiled in place with
+mypyc (`mypyc agents/ocr_core.py`) and is imported the same way either way.
+"""
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import re2  # google-re2: linear-time matching for OCR text of any size
+except ImportError:
+    re2 = None
+
+# Medicine name cleanup patterns, compiled once instead of per line
+_RE_LEAD_DOSE = re.compile(r'^\d+\s*(mg|ml|mcg|g|%)', re.IGNORECASE)
+_RE_HAS_CAPS = re.compile(r'[A-Z]')
+# Dosage | pack size ("1x10") | trailing count ("10's") | special characters | standalone numbers
+_RE_CLEAN = re.compile(
+    r'(?P<dose>\d+\.?\d*\s*(?:mg|ml|mcg|g|gm|gram|%|iu|unit))'
+    r'|(?P<pack>\d+\s*[x×]\s*\d+)'
+    r'|(?P<trail>\d+[\'s]*$)'
+    r'|(?P<bad>[^\w\s\-\/\&\+])'
+    r'|(?P<num>\b\d+\b)',
+    re.IGNORECASE
+)
+_RE_NONWORD_BASIC = re.compile(r'[^\w\s\-]')
+_RE_STDNUM = re.compile(r'\b\d+\b')
+_RE_NUMERIC_UNIT = re.compile(r'^\d+[a-z]*$')  # "500mg", "10ml"
+
+# Medicine evidence types and their weights, in reporting order
+_PATTERN_TYPES = ('dosage', 'form', 'route', 'package', 'medical', 'drug_name')
+_PATTERN_WEIGHTS = (0.25, 0.20, 0.15, 0.15, 0.15, 0.10)
+_MEDICINE_PATTERNS = tuple(zip(_PATTERN_TYPES, _PATTERN_WEIGHTS))
+# All six evidence types in one alternation, scanned in a single pass. Each outer group wraps
+# one inner group holding the reported match (original case, in text order); package info
+# uses a lookahead for its number so it can't swallow a following dosage.
+_RE_MEDICINE = re.compile(
+    r'(?P<dosage>\b\d+\s*(mg|ml|mcg|g|ml|L|IU|units?)\b)'
+    r'|(?P<form>\b(tablet|capsule|syrup|injection|cream|ointment|gel|drops|suspension|solution|powder|spray|inhaler|patch)\b)'
+    r'|(?P<route>\b(oral|topical|intravenous|intramuscular|subcutaneous|transdermal)\b)'
+    r'|(?P<package>\b(expiry|exp\.?|mfg\.?|batch|lot)(?=\s*:?\s*\d))'
+    r'|(?P<medical>\b(pharmaceutical|pharma|medicine|medication|drug|rx|℞)\b)'
+    r'|(?P<drug_name>\b(paracetamol|aspirin|ibuprofen|amoxicillin|metformin|omeprazole)\b)',
+    re.IGNORECASE
+)
+# RE2 has no lookaround, so with it each evidence type is scanned separately
+if re2 is not None:
+    _RE2_MEDICINE = tuple(zip(_PATTERN_TYPES, (
+        re2.compile(r'(?i)\b\d+\s*(mg|ml|mcg|g|ml|L|IU|units?)\b'),
+        re2.compile(r'(?i)\b(tablet|capsule|syrup|injection|cream|ointment|gel|drops|suspension|solution|powder|spray|inhaler|patch)\b'),
+        re2.compile(r'(?i)\b(oral|topical|intravenous|intramuscular|subcutaneous|transdermal)\b'),
+        re2.compile(r'(?i)\b(expiry|exp\.?|mfg\.?|batch|lot)\s*:?\s*\d'),
+        re2.compile(r'(?i)\b(pharmaceutical|pharma|medicine|medication|drug|rx|℞)\b'),
+        re2.compile(r'(?i)\b(paracetamol|aspirin|ibuprofen|amoxicillin|metformin|omeprazole)\b'),
+    )))
+
+# Manufacturer markers; lines containing these words are not the brand name
+_MFG_TOKENS = frozenset({
+    'pvt', 'ltd', 'limited', 'laboratories', 'laboratory',
+    'pharma', 'pharmaceutical', 'pharmaceuticals'
+})
+_RE_WORD = re.compile(r'[a-z]+')
+
+# Words to filter out (common non-medicine words)
+_FILTER_WORDS = frozenset({
+    'tablet', 'tablets', 'capsule', 'capsules', 'syrup', 'injection', 
+    'cream', 'ointment', 'gel', 'drops', 'suspension', 'solution',
+    'powder', 'spray', 'inhaler', 'patch', 'mg', 'ml', 'mcg', 'gm',
+    'each', 'pack', 'strip', 'box', 'bottle', 'contains', 'composition',
+    'expiry', 'exp', 'mfg', 'batch', 'lot', 'date', 'pharmaceutical',
+    'pharma', 'pvt', 'ltd', 'limited', 'pakistan', 'india', 'usa',
+    'made', 'manufactured', 'by', 'company', 'laboratories', 'lab',
+    'prescription', 'only', 'medicine', 'drug', 'store', 'between',
+    'keep', 'out', 'reach', 'children', 'doctor', 'pharmacist'
+})
+
+
+def tokenize(raw_text: str) -> Tuple[List[str], List[str]]:
+    """Split OCR text once into non-empty stripped lines and whitespace separated words"""
+    lines = [line for line in map(str.strip, raw_text.split('\n')) if line]
+    all_words = raw_text.split()
+    return lines, all_words
+
+
+@lru_cache(maxsize=256)
+def _detect_medicine(text: str) -> Tuple[bool, float, Tuple[Tuple[str, Tuple[str, ...], float], ...]]:
+    """
+    Pattern based medicine detection, cached since retried OCR often repeats the same text
+    Returns (is_medicine, confidence, ((type, matches, weight), ...)) as immutable tuples
+    """
+    # dict keys keep the first occurrence of each match, in text order
+    matches: Dict[str, Dict[str, None]] = {}
+    if re2 is not None:
+        for pattern_type, pattern in _RE2_MEDICINE:
+            found = pattern.findall(text)
+            if found:
+                matches[pattern_type] = dict.fromkeys(found)
+    else:
+        for match in _RE_MEDICINE.finditer(text):
+            matches.setdefault(match.lastgroup, {})[match.group(match.lastindex + 1)] = None
+    
+    detected: List[Tuple[str, Tuple[str, ...], float]] = []
+    confidence = 0.0
+    for pattern_type, weight in _MEDICINE_PATTERNS:
+        if pattern_type in matches:
+            detected.append((pattern_type, tuple(matches[pattern_type])[:3], weight))
+            confidence += weight
+    
+    return confidence >= 0.3, min(confidence, 1.0), tuple(detected)
+
+
+def is_medicine_related(text: str) -> Tuple[bool, float, List[Dict[str, Any]]]:
+    """Dynamic medicine detection using pattern matching."""
+    if not text or len(text.strip()) < 10:
+        return False, 0.0, []
+    
+    is_medicine, confidence, detected = _detect_medicine(text)
+    detected_patterns = [
+        {'type': pattern_type, 'matches': list(matches), 'weight': weight}
+        for pattern_type, matches, weight in detected
+    ]
+    return is_medicine, confidence, detected_patterns
+
+
+def extract_medicine_name(raw_text: str, lines: List[str], all_words: Optional[List[str]] = None) -> str:
+    """Enhanced medicine name extraction with better cleaning logic."""
+    medicine_name = ''
+    
+    # Strategy 1: Look for brand name patterns (usually CAPITALIZED or Title Case in first few lines)
+    for i, line_clean in enumerate(lines):
+        if i >= 5:  # Check first 5 lines
+            break
+        # lines are already stripped and non-empty
+        if len(line_clean) < 2:
+            continue
+        
+        # Skip lines that are purely dosage info
+        if _RE_LEAD_DOSE.match(line_clean):
+            continue
+        
+        # Skip manufacturer lines
+        if not _MFG_TOKENS.isdisjoint(_RE_WORD.findall(line_clean.lower())):
+            continue
+        
+        # Medicine names are often in first 1-2 lines and have capital letters
+        has_caps = bool(_RE_HAS_CAPS.search(line_clean))
+        
+        if has_caps or i < 2:  # First 2 lines or lines with capitals
+            # Remove dosage, packaging info, special characters and standalone numbers in one pass
+            cleaned = _RE_CLEAN.sub(' ', line_clean)
+            
+            # Split into words and filter
+            words = cleaned.split()
+            filtered_words = [
+                word for word in words 
+                if word.lower() not in _FILTER_WORDS 
+                and len(word) > 1
+                and not word.isdigit()
+            ]
+            
+            # Reconstruct name
+            potential_name = ' '.join(filtered_words)
+            
+            # If we got a good name (2-30 chars), use it; it is already whitespace-normalized
+            if 2 <= len(potential_name) <= 30:
+                print(f"🎯 Found medicine name in line {i+1}: '{potential_name}'")
+                return potential_name
+    
+    # Strategy 2: If no name found, look for the longest meaningful word sequence
+    if all_words is None:
+        all_words = raw_text.split()
+    filtered = [
+        w for w in all_words 
+        if len(w) > 2 
+        and not w.isdigit() 
+        and w.lower() not in _FILTER_WORDS
+        and not _RE_NUMERIC_UNIT.match(w.lower())
+    ]
+    
+    if filtered:
+        # Take first 1-3 meaningful words as medicine name
+        medicine_name = ' '.join(filtered[:3])
+        print(f"📝 Extracted from keywords: '{medicine_name}'")
+        return medicine_name
+    
+    # Strategy 3: Fallback to first line if still nothing
+    if lines:
+        first_line = lines[0]
+        # Basic cleaning
+        cleaned = _RE_NONWORD_BASIC.sub(' ', first_line)
+        cleaned = _RE_STDNUM.sub('', cleaned)
+        cleaned = ' '.join(cleaned.split())
+        medicine_name = cleaned[:50]  # Limit length
+        print(f"⚠️ Fallback to first line: '{medicine_name}'")
+    
+    # Final cleanup: remove extra spaces
+    medicine_name = ' '.join(medicine_name.split())
+    
+    return medicine_name
@@ -0,0 +1,97 @@
+"""
+Pinned EasyOCR model files and an offline-only Reader factory
+
+Each model is pinned by the SHA-256 of its extracted .pth file, with the MD5 that easyocr 1.7.0's
+config publishes (the version pinned in requirements.txt) as a secondary check. SHA-256 pins are
+taken from known-good release files with `python download_ocr_models.py --sha256`; a model with no
+SHA-256 pin is refused. download_ocr_models.py fetches and verifies the files ahead of time; any code
+that needs EasyOCR goes through get_easyocr_reader(), which verifies them again and constructs the
+Reader with downloads disabled, so a missing or altered model fails loudly instead of being fetched
+or loaded
+"""
+import hashlib
+import os
+import threading
+
+MODEL_DIR = os.path.abspath(os.getenv(
+    'EASYOCR_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'easyocr')
+))
+
+# filename -> release archive containing it and the expected digests of the extracted file.
+# sha256 is empty until pinned from a known-good copy; until then the model is refused
+PINNED_MODELS = {
+    'craft_mlt_25k.pth': {
+        'url': 'https://github.com/JaidedAI/EasyOCR/releases/download/pre-v1.1.6/craft_mlt_25k.zip',
+        'sha256': '',
+        'md5': '2f8227d2def4037cdb3b34389dcf9ec1',
+    },
+    'english_g2.pth': {
+        'url': 'https://github.com/JaidedAI/EasyOCR/releases/download/v1.3/english_g2.zip',
+        'sha256': '',
+        'md5': '5864788e1821be9e454ec108d61b887d',
+    },
+}
+
+
+class ModelIntegrityError(RuntimeError):
+    """A pinned model file is missing or does not match its pinned digests"""
+
+
+def file_digests(path):
+    """(SHA-256, MD5) hex digests of a file, read once in 1 MB chunks"""
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+def check_md5(filename, md5):
+    """Raise ModelIntegrityError unless md5 is the upstream-published digest of filename"""
+    expected = PINNED_MODELS[filename]['md5']
+    if md5 != expected:
+        raise ModelIntegrityError(f"{filename} MD5 {md5} does not match upstream {expected}")
+
+
+def verify_file(filename, path):
+    """Raise ModelIntegrityError unless path holds the pinned contents of filename"""
+    expected = PINNED_MODELS[filename]['sha256']
+    if not expected:
+        raise ModelIntegrityError(
+            f"No SHA-256 pinned for {filename}; pin it in agents/ocr_models.py from a known-good copy "
+            f"(python download_ocr_models.py --sha256)"
+        )
+    if not os.path.exists(path):
+        raise ModelIntegrityError(f"{filename} not found at {path}")
+    sha256, md5 = file_digests(path)
+    if sha256 != expected:
+        raise ModelIntegrityError(f"{filename} SHA-256 {sha256} does not match pinned {expected}")
+    check_md5(filename, md5)
+
+
+def verify_models(model_dir=MODEL_DIR):
+    """Check every pinned model in model_dir, raising on the first problem"""
+    for filename in PINNED_MODELS:
+        verify_file(filename, os.path.join(model_dir, filename))
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_easyocr_reader():
+    """Shared English Reader built from the verified local models; never downloads"""
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                verify_models()
+                import easyocr
+                _reader = easyocr.Reader(
+                    ['en'], gpu=False, model_storage_directory=MODEL_DIR,
+                    download_enabled=False, verbose=False
+                )
+    return _reader
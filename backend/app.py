@@ -1,11 +1,26 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flasgger import Swagger, swag_from
 import os
-from datetime import datetime
+import logging
+import time
+from functools import lru_cache, wraps
 import re
-import requests
+import httpx
+import tempfile
+import gzip
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import ahocorasick
+import orjson
 from dotenv import load_dotenv
+
+try:
+    import hyperscan
+except ImportError:  # sanitize_input falls back to the re pattern
+    hyperscan = None
 from agents.query_agent import QueryUnderstandingAgent
 from agents.ocr_agent import OCRAgent
 from agents.dataset_agent import DatasetSearchAgent
@@ -15,11 +30,40 @@ import traceback
 # Load environment variables
 load_dotenv()
 
+# Agents log through the logging module; debug-level tracing stays off unless asked for
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper(), format='%(levelname)s %(name)s: %(message)s')
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; honours sort_keys and debug pretty-printing"""
+    
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.compact is False or (self.compact is None and self._app.debug):
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+# Clients don't rely on key order or indentation, so skip the per-dict sort and whitespace
+app.json.sort_keys = False
+app.json.compact = True
 CORS(app)
 
 # Configure Swagger UI
-swagger_config = {
+_SWAGGER_CONFIG = {
     "headers": [],
     "specs": [
         {
@@ -34,7 +78,7 @@ swagger_config = {
     "specs_route": "/docs"
 }
 
-swagger_template = {
+_SWAGGER_TEMPLATE = {
     "swagger": "2.0",
     "info": {
         "title": "AI-LTH API Documentation",
@@ -78,42 +122,297 @@ swagger_template = {
     ]
 }
 
-swagger = Swagger(app, config=swagger_config, template=swagger_template)
+swagger = Swagger(app, config=_SWAGGER_CONFIG, template=_SWAGGER_TEMPLATE)
 
 # Load API keys from environment variables
 OPENROUTER_VISION_API_KEY = os.getenv('OPENROUTER_VISION_API_KEY')
 OPENROUTER_TEXT_API_KEY = os.getenv('OPENROUTER_TEXT_API_KEY')
 
-# Initialize agents
-query_agent = QueryUnderstandingAgent()
-ocr_agent = OCRAgent(api_key=OPENROUTER_VISION_API_KEY)  # Pass OpenRouter API key for Vision
-dataset_agent = DatasetSearchAgent()
-explanation_agent = ExplanationAgent()
+# Agents are built on first use, so a process only pays for the ones its requests need
+_agent_lock = threading.RLock()
 
-def sanitize_input(text):
+def _lazy_agent(factory):
+    """Build the agent on the first call and reuse it; the lock stops concurrent first requests building twice"""
+    instance = []
+    
+    @wraps(factory)
+    def getter():
+        if not instance:
+            with _agent_lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+    return getter
+
+@_lazy_agent
+def get_query_agent():
+    return QueryUnderstandingAgent()
+
+@_lazy_agent
+def get_ocr_agent():
+    return OCRAgent(api_key=OPENROUTER_VISION_API_KEY)  # Pass OpenRouter API key for Vision
+
+@_lazy_agent
+def get_dataset_agent():
+    return DatasetSearchAgent()
+
+@_lazy_agent
+def get_explanation_agent():
+    agent = ExplanationAgent()
+    agent.set_canonical_brands(get_dataset_agent().get_all_medicine_names())
+    return agent
+
+ALLOWED_IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png'})
+# Uploads are spooled to RAM-backed tmpfs when the host has one
+UPLOAD_TMP_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Medicine validation shares the explanation agent's HTTP/2 client, so validation and
+# explanation calls from every worker thread multiplex over one TLS connection to OpenRouter
+OPENROUTER_CHAT_URL = "https://openrouter.ai/api/v1/chat/completions"
+VALIDATION_TIMEOUT = httpx.Timeout(5.0, connect=3.05)
+
+_RE_WHITESPACE = re.compile(r'\s+')
+
+def iso_now():
+    """Current UTC time as an ISO 8601 string with microseconds, e.g. 2024-01-01T12:00:00.000000Z"""
+    now = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)) + f'.{int(now * 1e6) % 1000000:06d}Z'
+
+def normalize_query(text):
+    """Lowercase and collapse whitespace so repeated questions share a cache entry"""
+    return _RE_WHITESPACE.sub(' ', text.strip().lower())
+
+# The image validation rubric lives in a fixed system message so every call shares a byte-identical
+# prefix that providers can prompt-cache; only the short user message varies
+IMAGE_VALIDATION_RUBRIC = """Is this text about a medicine, pharmaceutical product, or medical treatment?
+
+Answer ONLY "YES" if it's about:
+- Medicine names (tablets, capsules, syrups, injections, etc.)
+- Pharmaceutical products
+- Medical treatments or drugs
+- Healthcare products
+
+Answer ONLY "NO" if it's:
+- Food items
+- Household products
+- Random text or non-medical content
+- Greetings or general conversation
+
+Answer with only YES or NO."""
+
+def _cached_system_message(text):
+    """System message marked as a prompt-cache breakpoint (honoured by Anthropic/Gemini, ignored elsewhere)"""
+    return {
+        "role": "system",
+        "content": [{"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}]
+    }
+
+IMAGE_VALIDATION_SYSTEM = _cached_system_message(IMAGE_VALIDATION_RUBRIC)
+
+def _ask_yes_no(system_message, user_content):
     """
-    Sanitize user input to prevent injection attacks
+    Ask the LLM a YES/NO validation question, True unless it answers NO
+    Raises on API failure so a failed call is never cached as a verdict
+    """
+    explanation_agent = get_explanation_agent()
+    validation_response = explanation_agent.client.post(
+        OPENROUTER_CHAT_URL,
+        # The client already sends Content-Type: application/json
+        content=orjson.dumps({
+            "model": explanation_agent.model,
+            "messages": [system_message, {"role": "user", "content": user_content}],
+            "max_tokens": 10,
+            "temperature": 0.1
+        }),
+        timeout=VALIDATION_TIMEOUT
+    )
+    if validation_response.status_code != 200:
+        raise RuntimeError(f"validation API returned {validation_response.status_code}")
+    
+    validation_result = orjson.loads(validation_response.content)
+    answer = validation_result['choices'][0]['message']['content'].strip().upper()
+    print(f"✅ Validation result: {answer}")
+    return "NO" not in answer
+
+# Shared pool for validation calls that overlap with local work; the HTTP timeout bounds each task
+VALIDATION_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix='validation')
+
+@lru_cache(maxsize=4096)
+def classify_medicine_image(norm_name, text_snippet):
+    """Is the medicine name and OCR text read from an image about medicine? Cached"""
+    return _ask_yes_no(
+        IMAGE_VALIDATION_SYSTEM,
+        f'Extracted text: "{norm_name}"\nRaw OCR text: "{text_snippet}"'
+    )
+
+# Text queries are validated inside the explanation call itself (see ExplanationAgent.generate)
+NOT_MEDICINE_QUERY_RESPONSE = {
+    'status': 'error',
+    'message': 'I can only provide information about medicines and medical conditions. Please ask about a specific medicine name or health condition.'
+}
+
+NOT_MEDICINE_IMAGE_RESPONSE = {
+    'status': 'error',
+    'message': 'I can only provide information about medicines and pharmaceutical products. The image does not appear to contain medicine packaging. Please upload a clear photo of medicine packaging or use the Chat feature to ask about a specific medicine.'
+}
+
+def is_rejected(explanation_data):
+    """True when the combined explanation call judged the query not medicine-related"""
+    return isinstance(explanation_data, dict) and explanation_data.get('is_medicine') is False
+
+DISCLAIMER = 'This AI provides informational content only and is not a substitute for professional medical advice. Always consult a qualified healthcare professional.'
+
+# Fields that never change between responses of one mode, built once at import
+_RESPONSE_TEMPLATES = {
+    'text': {'status': 'success', 'mode': 'text', 'agent_used': 'TextAgent', 'disclaimer': DISCLAIMER},
+    'image': {'status': 'success', 'mode': 'image', 'agent_used': 'ImageAgent', 'disclaimer': DISCLAIMER},
+}
+# Dataset-match confidence when the search result carries none
+_DEFAULT_MATCH_CONFIDENCE = {'text': 0.95, 'image': 0.90}
+_GENERAL_KNOWLEDGE_CONFIDENCE = 0.50
+_NO_SIDE_EFFECTS = ('Information not available',)
+
+def build_response(mode, input_query, medicine_name, medicine_data, explanation_data, extra=None):
+    """Build the success payload shared by /api/query and /api/image
+
+    medicine_data is the dataset match, or None when the explanation came from
+    general knowledge. extra holds the mode-specific fields (OCR details etc.)
+    """
+    # Handle both dict and string responses (backwards compatibility)
+    if isinstance(explanation_data, dict):
+        description = explanation_data.get('description', '')
+        side_effects = explanation_data.get('side_effects', [])
+        uses = explanation_data.get('uses', 'N/A')
+        warnings = explanation_data.get('warnings', '')
+    else:
+        description = explanation_data
+        side_effects = []
+        uses = 'N/A'
+        warnings = ''
+    
+    if medicine_data:
+        medicine_name = medicine_data.get('brand_name')
+        generic_name = medicine_data.get('generic_name', 'N/A')
+        manufacturer = medicine_data.get('manufacturer', 'N/A')
+        confidence = medicine_data.get('confidence', _DEFAULT_MATCH_CONFIDENCE[mode])
+    else:
+        generic_name = manufacturer = 'N/A'
+        confidence = _GENERAL_KNOWLEDGE_CONFIDENCE
+    
+    response = {
+        **_RESPONSE_TEMPLATES[mode],
+        'input_query': input_query,
+        'medicine_name': medicine_name,
+        'generic_name': generic_name,
+        'description': description,
+        'uses': uses,
+        'warnings': warnings,
+        'side_effects': side_effects or _NO_SIDE_EFFECTS,
+        'manufacturer': manufacturer,
+        'dataset_match': bool(medicine_data),
+        'confidence': confidence,
+        'timestamp': iso_now(),
+    }
+    if mode == 'text':
+        response['ai_explanation'] = description
+    if extra:
+        response.update(extra)
+    return response
+
+class ResponseCache:
+    """Thread-safe LRU of finished /api/query payloads with a time-to-live
+
+    Entries are stored without their timestamp; a fresh one is stamped on every hit
     """
-    # Remove potential SQL injection patterns
-    dangerous_patterns = [
-        r'(\bDROP\b|\bDELETE\b|\bINSERT\b|\bUPDATE\b|\bEXEC\b|\bEXECUTE\b)',
-        r'(<script|javascript:|onerror=|onclick=)',
-        r'(union.*select|select.*from)',
-    ]
     
-    text_lower = text.lower()
-    for pattern in dangerous_patterns:
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            return None  # Reject malicious input
+    def __init__(self, maxsize=1024, ttl=600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
     
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expiry, payload = entry
+            if time.monotonic() >= expiry:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return {**payload, 'timestamp': iso_now()}
+    
+    def set(self, key, response):
+        payload = {k: v for k, v in response.items() if k != 'timestamp'}
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+# Repeat questions ("what is panadol?") skip all three agents
+query_response_cache = ResponseCache(
+    maxsize=int(os.getenv('QUERY_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('QUERY_CACHE_TTL', 600))
+)
+
+# SQL keywords | script injection | SQL query shapes, matched case-insensitively
+_DANGEROUS_PATTERNS = (
+    r'\b(?:DROP|DELETE|INSERT|UPDATE|EXEC|EXECUTE)\b',
+    r'<script', r'javascript:', r'onerror=', r'onclick=',
+    r'union.*select', r'select.*from',
+)
+_DANGEROUS_RE = re.compile('(?i)' + '|'.join(_DANGEROUS_PATTERNS))
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def _compile_dangerous_hs():
+    """Hyperscan database for the dangerous patterns, or None to use the re pattern"""
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.encode('ascii') for pattern in _DANGEROUS_PATTERNS],
+            ids=list(range(len(_DANGEROUS_PATTERNS))),
+            elements=len(_DANGEROUS_PATTERNS),
+            flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(_DANGEROUS_PATTERNS)
+        )
+        return db
+    except Exception as e:
+        print(f"⚠️ Hyperscan unavailable ({e}), using re for input sanitizing")
+        return None
+
+_DANGEROUS_HS = _compile_dangerous_hs()
+_hs_local = threading.local()  # Hyperscan scratch space is per thread
+
+def _on_dangerous_match(pattern_id, start, end, flags, hits):
+    """Record the match and stop scanning"""
+    hits.append(pattern_id)
+    return True
+
+def contains_dangerous_input(text):
+    """True if text matches any SQL/script injection pattern"""
+    if _DANGEROUS_HS is None:
+        return _DANGEROUS_RE.search(text) is not None
     
-    # Limit length
-    if len(text) > 500:
-        text = text[:500]
+    scratch = getattr(_hs_local, 'scratch', None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_DANGEROUS_HS)
+    hits = []
+    _DANGEROUS_HS.scan(text.encode('utf-8'), match_event_handler=_on_dangerous_match, context=hits, scratch=scratch)
+    return bool(hits)
+
+def sanitize_input(text):
+    """
+    Sanitize user input to prevent injection attacks
+    """
+    # Reject potential SQL/script injection patterns
+    if contains_dangerous_input(text):
+        return None  # Reject malicious input
     
-    return text.strip()
+    # Remove HTML tags and limit length
+    return _TAG_RE.sub('', text)[:500].strip()
 
 # Medicine-related keywords for validation
 MEDICINE_KEYWORDS = [
@@ -122,24 +421,130 @@ MEDICINE_KEYWORDS = [
     'dosage', 'prescription', 'pharmacy', 'treatment', 'cure', 'disease',
     'pain', 'headache', 'cough', 'cold', 'infection', 'vitamin', 'supplement'
 ]
+# Drug and dosage-form terms that mark OCR text as a medicine package. Symptoms and
+# question phrases are left out: "cold", "pain" or "what is" turn up on ordinary images
+MEDICINE_SCAN_TERMS = [
+    'medicine', 'medicines', 'drug', 'drugs', 'medication', 'pharmaceutical', 'pharmaceuticals',
+    'tablet', 'tablets', 'capsule', 'capsules', 'syrup', 'injection', 'pill', 'pills',
+    'suspension', 'ointment', 'cream', 'drops', 'inhaler', 'antibiotic', 'painkiller',
+    'vitamin', 'vitamins', 'supplement', 'prescription'
+]
 
-def is_medicine_related(query):
-    """Check if query is medicine-related"""
-    query_lower = query.lower()
-    
-    # Check for medicine keywords
-    for keyword in MEDICINE_KEYWORDS:
-        if keyword in query_lower:
+def _build_keyword_automaton(words):
+    """Aho-Corasick automaton so every term is found in one pass"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+_MEDICINE_SCAN_AUTOMATON = _build_keyword_automaton(MEDICINE_SCAN_TERMS)
+
+def _contains_whole_word(automaton, text):
+    """True if a term of the automaton occurs in text as a whole word ("pill", not "spill")"""
+    for end, term in automaton.iter(text):
+        start = end - len(term) + 1
+        if (start == 0 or not text[start - 1].isalnum()) and (end + 1 == len(text) or not text[end + 1].isalnum()):
             return True
-    
-    # Check for common question patterns
-    if any(phrase in query_lower for phrase in [
-        'what is', 'tell me about', 'explain', 'side effect', 
-        'used for', 'how to use', 'dosage', 'can i take'
-    ]):
+    return False
+
+# OCR confidence above which a medicine term in the scan is trusted without the LLM
+CONFIDENT_SCAN_THRESHOLD = 0.75
+
+def is_confident_medicine_scan(ocr_result):
+    """True when a clear OCR read contains a drug or dosage-form term as a whole word"""
+    if ocr_result.get('confidence', 0.0) < CONFIDENT_SCAN_THRESHOLD:
+        return False
+    raw_text = ocr_result.get('raw_text') or ''
+    return _contains_whole_word(_MEDICINE_SCAN_AUTOMATON, raw_text.lower())
+
+_MEDICINE_KEYWORD_SET = frozenset(MEDICINE_KEYWORDS)
+# Queries made only of these words are small talk, not medicine questions
+_SMALL_TALK_WORDS = frozenset({
+    'hi', 'hello', 'hey', 'hii', 'salam', 'thanks', 'thank', 'you', 'there',
+    'good', 'morning', 'evening', 'night', 'bye', 'ok', 'okay', 'how', 'are'
+})
+_RE_QUERY_WORD = re.compile(r'[a-z]+')
+
+def cheap_classify(norm_query):
+    """
+    Local medicine verdict for a normalized query: True on a whole-word medicine keyword,
+    False when it is nothing but small talk, None when the LLM has to decide
+    """
+    words = set(_RE_QUERY_WORD.findall(norm_query))
+    if not words:
+        return None
+    # Plurals ("tablets", "vitamins") count as their keyword
+    if not _MEDICINE_KEYWORD_SET.isdisjoint(words) or not _MEDICINE_KEYWORD_SET.isdisjoint(
+            [word[:-1] for word in words if word.endswith('s')]):
         return True
-    
-    return True  # Allow all for now, AI will filter
+    if words <= _SMALL_TALK_WORDS:
+        return False
+    return None
+
+# Bodies at least this large are gzipped when the client accepts it
+GZIP_MIN_BYTES = 1024
+
+# endpoint -> (etag, JSON body, gzipped body); only the latest version of each is kept
+# (a single dict store, so concurrent rebuilds just race to write identical bytes)
+_json_bodies = {}
+
+def _encoded_bodies(etag, build_payload):
+    """Serialize (and gzip) an endpoint's payload once per ETag"""
+    cached = _json_bodies.get(request.endpoint)
+    if cached is not None and cached[0] == etag:
+        return cached[1], cached[2]
+    body = orjson.dumps(build_payload(), option=app.json._options() | orjson.OPT_APPEND_NEWLINE)
+    gzipped = gzip.compress(body, compresslevel=1) if len(body) >= GZIP_MIN_BYTES else None
+    _json_bodies[request.endpoint] = (etag, body, gzipped)
+    return body, gzipped
+
+def cached_json_response(etag, build_payload, max_age=60):
+    """
+    JSON response tagged with a (weak) ETag; answers 304 without building the payload
+    when the client already holds this version, and reuses the encoded body otherwise
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        body, gzipped = _encoded_bodies(etag, build_payload)
+        if gzipped is not None and 'gzip' in request.accept_encodings:
+            response = app.response_class(gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = app.response_class(body, mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+def _medicines_payload():
+    return {'medicines': get_dataset_agent().get_all_medicine_names()}
+
+def _dataset_info_payload():
+    return get_dataset_agent().get_dataset_info()
+
+def _agents_status_payload():
+    dataset_agent = get_dataset_agent()
+    return {
+        'agents': [
+            {'name': 'QueryUnderstandingAgent', 'status': 'active'},
+            {'name': 'OCRAgent', 'status': 'active'},
+            {'name': 'DatasetSearchAgent', 'status': 'active'},
+            {'name': 'ExplanationAgent', 'status': 'active'}
+        ],
+        'dataset_loaded': dataset_agent.is_loaded(),
+        'dataset_records': len(dataset_agent.df) if dataset_agent.df is not None else 0,
+        'pdf_files': len(dataset_agent.pdf_data),
+        'llm_available': get_explanation_agent().is_available()
+    }
+
+# Read-only routes that /api/batch can bundle into one response
+BATCH_ROUTES = {
+    '/api/medicines': _medicines_payload,
+    '/api/dataset/info': _dataset_info_payload,
+    '/api/agents/status': _agents_status_payload,
+}
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -170,7 +575,7 @@ def health_check():
     return jsonify({
         'status': 'success',
         'message': 'AI-LTH Backend is running',
-        'timestamp': datetime.utcnow().isoformat() + 'Z'
+        'timestamp': iso_now()
     })
 
 @app.route('/api/query', methods=['POST'])
@@ -292,145 +697,46 @@ def handle_query():
         
         print(f"📝 Query: {user_query}")
         
-        # Validate if query is medicine-related (quick keyword check)
-        # Use LLM to intelligently detect if query is medicine-related
-        validation_prompt = f"""Is this query about a medicine, medical condition, or healthcare product?
-Query: "{user_query}"
-
-Answer ONLY "YES" if it's about:
-- Medicine names (Panadol, Aspirin, etc.)
-- Symptoms/conditions (headache, fever, diabetes, etc.)
-- Medical products (tablets, syrups, injections, etc.)
-- Healthcare questions related to medicines
-
-Answer ONLY "NO" if it's:
-- Greetings (hello, hi, hey)
-- General questions (weather, time, jokes)
-- Non-medical topics
-
-Answer with only YES or NO:"""
-
-        try:
-            validation_response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {explanation_agent.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": explanation_agent.model,
-                    "messages": [{"role": "user", "content": validation_prompt}],
-                    "max_tokens": 10,
-                    "temperature": 0.1
-                },
-                timeout=5
-            )
-            
-            if validation_response.status_code == 200:
-                validation_result = validation_response.json()
-                answer = validation_result['choices'][0]['message']['content'].strip().upper()
-                
-                if "NO" in answer:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'I can only provide information about medicines and medical conditions. Please ask about a specific medicine name or health condition.'
-                    }), 400
-        except:
-            # If validation fails, continue anyway (fail open, not closed)
-            pass
+        # Obvious cases are settled locally; otherwise the LLM checks the query is
+        # medicine-related in the same call that explains it. If that call fails the
+        # fallback explanation is served (fail open, not closed)
+        norm_query = normalize_query(user_query)
+        cached_response = query_response_cache.get(norm_query)
+        if cached_response is not None:
+            print("⚡ Response cache hit")
+            cached_response['input_query'] = user_query
+            return jsonify(cached_response)
+        
+        verdict = cheap_classify(norm_query)
+        if verdict is False:
+            return jsonify(NOT_MEDICINE_QUERY_RESPONSE), 400
+        validate_query = norm_query if verdict is None else None
         
         # Agent 1: Query Understanding Agent - Parse user input
-        parsed_query = query_agent.parse(user_query)
+        parsed_query = get_query_agent().parse(user_query)
         
         # Agent 2: Dataset Search Agent - Check database first
-        medicine_data = dataset_agent.search(parsed_query['medicine_name'])
+        medicine_data = get_dataset_agent().search(parsed_query['medicine_name'])
         
-        # Agent 3: Explanation Agent - Generate explanation
-        if medicine_data:
-            # Found in dataset - AI explains with dataset info
-            explanation_data = explanation_agent.generate(medicine_data)
-            
-            # Handle both dict and string responses (backwards compatibility)
-            if isinstance(explanation_data, dict):
-                description = explanation_data.get('description', '')
-                side_effects = explanation_data.get('side_effects', [])
-                uses = explanation_data.get('uses', 'N/A')
-                warnings = explanation_data.get('warnings', '')
-            else:
-                description = explanation_data
-                side_effects = []
-                uses = 'N/A'
-                warnings = ''
-            
-            agent_chain = [
-                '1. Query Understanding Agent',
-                '2. Dataset Search Agent (Found in Pakistan Database)',
-                '3. AI Explanation Agent (OpenRouter GPT-3.5)'
-            ]
-            
-            return jsonify({
-                'status': 'success',
-                'mode': 'text',
-                'input_query': user_query,
-                'medicine_name': medicine_data.get('brand_name'),
-                'generic_name': medicine_data.get('generic_name', 'N/A'),
-                'description': description,
-                'uses': uses,
-                'warnings': warnings,
-                'ai_explanation': description,
-                'side_effects': side_effects if side_effects else ['Information not available'],
-                'manufacturer': medicine_data.get('manufacturer', 'N/A'),
-                'agent_used': 'TextAgent',
-                'dataset_match': True,
-                'confidence': medicine_data.get('confidence', 0.95),
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'disclaimer': 'This AI provides informational content only and is not a substitute for professional medical advice. Always consult a qualified healthcare professional.'
-            })
-        else:
-            # Not found in dataset - AI uses general knowledge
-            medicine_data_empty = {
+        # Agent 3: Explanation Agent - Generate explanation; when the medicine is
+        # not in the dataset the AI falls back to general knowledge
+        explanation_data = get_explanation_agent().generate(
+            medicine_data or {
                 'brand_name': parsed_query['medicine_name'],
                 'generic_name': 'N/A',
                 'manufacturer': 'N/A'
-            }
-            explanation_data = explanation_agent.generate(medicine_data_empty)
-            
-            # Handle both dict and string responses
-            if isinstance(explanation_data, dict):
-                description = explanation_data.get('description', '')
-                side_effects = explanation_data.get('side_effects', [])
-                uses = explanation_data.get('uses', 'N/A')
-                warnings = explanation_data.get('warnings', '')
-            else:
-                description = explanation_data
-                side_effects = []
-                uses = 'N/A'
-                warnings = ''
-            
-            agent_chain = [
-                '1. Query Understanding Agent',
-                '2. Dataset Search Agent (Not found in Pakistan Database)',
-                '3. AI Explanation Agent (OpenRouter GPT-3.5 - General Knowledge)'
-            ]
-            
-            return jsonify({
-                'status': 'success',
-                'mode': 'text',
-                'input_query': user_query,
-                'medicine_name': parsed_query['medicine_name'],
-                'generic_name': 'N/A',
-                'description': description,
-                'uses': uses,
-                'warnings': warnings,
-                'ai_explanation': description,
-                'side_effects': side_effects if side_effects else ['Information not available'],
-                'manufacturer': 'N/A',
-                'agent_used': 'TextAgent',
-                'dataset_match': False,
-                'confidence': 0.50,
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'disclaimer': 'This AI provides informational content only and is not a substitute for professional medical advice. Always consult a qualified healthcare professional.'
-            })
+            },
+            validate_query=validate_query
+        )
+        if is_rejected(explanation_data):
+            return jsonify(NOT_MEDICINE_QUERY_RESPONSE), 400
+        
+        response = build_response('text', user_query, parsed_query['medicine_name'],
+                                  medicine_data, explanation_data)
+        # Fallback text from an API outage is not cached, so the next ask retries the API
+        if not (isinstance(explanation_data, dict) and explanation_data.get('is_fallback')):
+            query_response_cache.set(norm_query, response)
+        return jsonify(response)
     except Exception as e:
         print(f"❌ Error in /api/query: {e}")
         traceback.print_exc()
@@ -555,6 +861,7 @@ def handle_image():
               type: string
               example: An error occurred while processing the image.
     """
+    upload_path = None
     try:
         if 'image' not in request.files:
             return jsonify({
@@ -565,9 +872,9 @@ def handle_image():
         image_file = request.files['image']
         
         # Validate file type
-        allowed_extensions = {'.jpg', '.jpeg', '.png'}
-        file_ext = os.path.splitext(image_file.filename)[1].lower()
-        if file_ext not in allowed_extensions:
+        _, dot, ext = (image_file.filename or '').rpartition('.')
+        file_ext = '.' + ext.lower()
+        if not dot or file_ext not in ALLOWED_IMAGE_EXTENSIONS:
             return jsonify({
                 'status': 'error',
                 'message': 'Invalid file type. Only .jpg, .jpeg, .png are allowed.'
@@ -575,8 +882,14 @@ def handle_image():
         
         print(f"📸 Received image: {image_file.filename}")
         
+        # Write the upload once to a temp file and let PIL read it from the path,
+        # instead of buffering it again in memory for the OCR agent
+        with tempfile.NamedTemporaryFile(suffix=file_ext, dir=UPLOAD_TMP_DIR, delete=False) as upload:
+            upload_path = upload.name
+            image_file.save(upload)
+        
         # Agent 1: OCR processing
-        ocr_result = ocr_agent.extract_text(image_file)
+        ocr_result = get_ocr_agent().extract_text(upload_path)
         
         print(f"🔍 OCR Result: {ocr_result}")
         
@@ -616,149 +929,43 @@ def handle_image():
         
         # Validate with LLM: Is this actually a medicine?
         print(f"🔍 Validating if '{medicine_name}' is medicine-related...")
-        validation_prompt = f"""Is this text about a medicine, pharmaceutical product, or medical treatment?
-Extracted text: "{medicine_name}"
-Raw OCR text: "{extracted_text[:200]}"
-
-Answer ONLY "YES" if it's about:
-- Medicine names (tablets, capsules, syrups, injections, etc.)
-- Pharmaceutical products
-- Medical treatments or drugs
-- Healthcare products
-
-Answer ONLY "NO" if it's:
-- Food items
-- Household products
-- Random text or non-medical content
-- Greetings or general conversation
-
-Answer with only YES or NO:"""
-
-        try:
-            validation_response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {explanation_agent.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": explanation_agent.model,
-                    "messages": [{"role": "user", "content": validation_prompt}],
-                    "max_tokens": 10,
-                    "temperature": 0.1
-                },
-                timeout=5
+        validation = None
+        # A clear scan with a drug or dosage-form term settles it locally; everything else
+        # goes to the LLM (cheap_classify is for typed queries and trusts symptom words)
+        if is_confident_medicine_scan(ocr_result):
+            print("✅ Clear scan with medicine keywords, skipping LLM validation")
+        else:
+            # Runs in the background while the dataset is searched below
+            validation = VALIDATION_EXECUTOR.submit(
+                classify_medicine_image, normalize_query(medicine_name), extracted_text[:200]
             )
-            
-            if validation_response.status_code == 200:
-                validation_result = validation_response.json()
-                answer = validation_result['choices'][0]['message']['content'].strip().upper()
-                print(f"✅ Validation result: {answer}")
-                
-                if "NO" in answer:
-                    return jsonify({
-                        'status': 'error',
-                        'message': 'I can only provide information about medicines and pharmaceutical products. The image does not appear to contain medicine packaging. Please upload a clear photo of medicine packaging or use the Chat feature to ask about a specific medicine.'
-                    }), 400
-        except Exception as e:
-            print(f"⚠️ Validation API failed: {e}, continuing anyway...")
-            # If validation fails, continue (fail open)
         
         # Agent 2: Dataset Search Agent - Check database
-        medicine_data = dataset_agent.search(ocr_result['medicine_name'])
+        medicine_data = get_dataset_agent().search(ocr_result['medicine_name'])
         
-        # Agent 3: Explanation Agent - Generate explanation
-        if medicine_data:
-            # Found in dataset - AI explains with dataset info
-            explanation_data = explanation_agent.generate(medicine_data)
-            
-            # Handle both dict and string responses
-            if isinstance(explanation_data, dict):
-                description = explanation_data.get('description', '')
-                side_effects = explanation_data.get('side_effects', [])
-                uses = explanation_data.get('uses', 'N/A')
-                warnings = explanation_data.get('warnings', '')
-            else:
-                description = explanation_data
-                side_effects = []
-                uses = 'N/A'
-                warnings = ''
-            
-            agent_chain = [
-                '1. OCR Agent (Tesseract OCR - Local)',
-                '2. Dataset Search Agent (Found in Pakistan Database)',
-                '3. AI Explanation Agent (OpenRouter gpt-oss-20b)'
-            ]
-            
-            return jsonify({
-                'status': 'success',
-                'mode': 'image',
-                'input_query': f'Image scan: {image_file.filename}',
-                'ocr_text': ocr_result.get('raw_text', '')[:300],
-                'detected_patterns': ocr_result.get('detected_patterns', []),
-                'ocr_confidence': ocr_result.get('confidence', 0.0),
-                'model_info': ocr_result.get('model_info', {}),
-                'medicine_name': medicine_data.get('brand_name'),
-                'generic_name': medicine_data.get('generic_name', 'N/A'),
-                'description': description,
-                'uses': uses,
-                'warnings': warnings,
-                'side_effects': side_effects if side_effects else ['Information not available'],
-                'manufacturer': medicine_data.get('manufacturer', 'N/A'),
-                'agent_used': 'ImageAgent',
-                'dataset_match': True,
-                'confidence': medicine_data.get('confidence', 0.90),
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'disclaimer': 'This AI provides informational content only and is not a substitute for professional medical advice. Always consult a qualified healthcare professional.'
-            })
-        else:
-            # Not found in dataset - AI uses general knowledge
-            medicine_data_empty = {
-                'brand_name': ocr_result['medicine_name'],
-                'generic_name': 'N/A',
-                'manufacturer': 'N/A'
-            }
-            explanation_data = explanation_agent.generate(medicine_data_empty)
-            
-            # Handle both dict and string responses
-            if isinstance(explanation_data, dict):
-                description = explanation_data.get('description', '')
-                side_effects = explanation_data.get('side_effects', [])
-                uses = explanation_data.get('uses', 'N/A')
-                warnings = explanation_data.get('warnings', '')
-            else:
-                description = explanation_data
-                side_effects = []
-                uses = 'N/A'
-                warnings = ''
-            
-            agent_chain = [
-                '1. OCR Agent (Tesseract OCR - Local)',
-                '2. Dataset Search Agent (Not found in Pakistan Database)',
-                '3. AI Explanation Agent (OpenRouter gpt-oss-20b - General Knowledge)'
-            ]
-            
-            return jsonify({
-                'status': 'success',
-                'mode': 'image',
-                'input_query': f'Image scan: {image_file.filename}',
-                'ocr_text': ocr_result.get('raw_text', '')[:300],
-                'detected_patterns': ocr_result.get('detected_patterns', []),
-                'ocr_confidence': ocr_result.get('confidence', 0.0),
-                'model_info': ocr_result.get('model_info', {}),
-                'medicine_name': ocr_result['medicine_name'],
-                'generic_name': 'N/A',
-                'description': description,
-                'uses': uses,
-                'warnings': warnings,
-                'side_effects': side_effects if side_effects else ['Information not available'],
-                'manufacturer': 'N/A',
-                'agent_used': 'ImageAgent',
-                'dataset_match': False,
-                'confidence': 0.50,
-                'timestamp': datetime.utcnow().isoformat() + 'Z',
-                'disclaimer': 'This AI provides informational content only and is not a substitute for professional medical advice. Always consult a qualified healthcare professional.'
-            })
+        if validation is not None:
+            try:
+                if not validation.result():
+                    return jsonify(NOT_MEDICINE_IMAGE_RESPONSE), 400
+            except Exception as e:
+                print(f"⚠️ Validation API failed: {e}, continuing anyway...")
+                # If validation fails, continue (fail open)
+        
+        # Agent 3: Explanation Agent - Generate explanation; when the medicine is
+        # not in the dataset the AI falls back to general knowledge
+        explanation_data = get_explanation_agent().generate(medicine_data or {
+            'brand_name': ocr_result['medicine_name'],
+            'generic_name': 'N/A',
+            'manufacturer': 'N/A'
+        })
+        
+        return jsonify(build_response('image', f'Image scan: {image_file.filename}',
+                                      ocr_result['medicine_name'], medicine_data, explanation_data, {
+            'ocr_text': ocr_result.get('raw_text', '')[:300],
+            'detected_patterns': ocr_result.get('detected_patterns', []),
+            'ocr_confidence': ocr_result.get('confidence', 0.0),
+            'model_info': ocr_result.get('model_info', {}),
+        }))
     except Exception as e:
         print(f"❌ Exception in /api/image: {str(e)}")
         traceback.print_exc()
@@ -767,6 +974,12 @@ Answer with only YES or NO:"""
             'message': 'An error occurred while processing the image.',
             'details': str(e)
         }), 500
+    finally:
+        if upload_path is not None:
+            try:
+                os.remove(upload_path)
+            except OSError:
+                pass
 
 @app.route('/api/medicines', methods=['GET'])
 def get_medicines():
@@ -798,8 +1011,7 @@ def get_medicines():
               example: Database not loaded
     """
     try:
-        medicines = dataset_agent.get_all_medicine_names()
-        return jsonify({'medicines': medicines})
+        return cached_json_response(get_dataset_agent().version, _medicines_payload)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -861,7 +1073,7 @@ def get_medicine(name):
               example: Database query failed
     """
     try:
-        medicine_data = dataset_agent.search(name)
+        medicine_data = get_dataset_agent().search(name)
         if not medicine_data:
             return jsonify({'error': 'Medicine not found'}), 404
         return jsonify(medicine_data)
@@ -914,18 +1126,8 @@ def agents_status():
               type: boolean
               example: true
     """
-    return jsonify({
-        'agents': [
-            {'name': 'QueryUnderstandingAgent', 'status': 'active'},
-            {'name': 'OCRAgent', 'status': 'active'},
-            {'name': 'DatasetSearchAgent', 'status': 'active'},
-            {'name': 'ExplanationAgent', 'status': 'active'}
-        ],
-        'dataset_loaded': dataset_agent.is_loaded(),
-        'dataset_records': len(dataset_agent.df) if dataset_agent.df is not None else 0,
-        'pdf_files': len(dataset_agent.pdf_data),
-        'llm_available': explanation_agent.is_available()
-    })
+    llm_available = get_explanation_agent().is_available()
+    return cached_json_response(f"{get_dataset_agent().version}-{int(llm_available)}", _agents_status_payload)
 
 @app.route('/api/dataset/info', methods=['GET'])
 def dataset_info():
@@ -979,17 +1181,85 @@ def dataset_info():
               example: Database not accessible
     """
     try:
-        info = {
-            'csv_loaded': dataset_agent.df is not None,
-            'csv_records': len(dataset_agent.df) if dataset_agent.df is not None else 0,
-            'csv_columns': list(dataset_agent.df.columns) if dataset_agent.df is not None else [],
-            'pdf_loaded': len(dataset_agent.pdf_data) > 0,
-            'pdf_files': [pdf['filename'] for pdf in dataset_agent.pdf_data],
-            'total_medicines': len(dataset_agent.get_all_medicine_names())
-        }
-        return jsonify(info)
+        return cached_json_response(get_dataset_agent().version, _dataset_info_payload)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """
+    Batch Read Endpoints
+    ---
+    tags:
+      - Database
+    summary: Fetch several read-only endpoints in one round trip
+    description: |
+      Send a JSON list of routes and get each route's payload back, keyed by route.
+      Supported routes are /api/medicines, /api/dataset/info and /api/agents/status,
+      so a client can load everything it needs at startup with a single request.
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: array
+          items:
+            type: string
+          example: ["/api/agents/status", "/api/dataset/info", "/api/medicines"]
+    responses:
+      200:
+        description: Payload of each requested route
+        schema:
+          type: object
+      400:
+        description: Body is not a list of supported routes
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Unsupported route: /api/query"
+    """
+    routes = request.get_json(silent=True)
+    if not isinstance(routes, list) or not all(isinstance(route, str) for route in routes):
+        return jsonify({'error': 'Expected a JSON list of routes'}), 400
+    unsupported = [route for route in routes if route not in BATCH_ROUTES]
+    if unsupported:
+        return jsonify({'error': f"Unsupported route: {', '.join(unsupported)}"}), 400
+    
+    try:
+        return jsonify({route: BATCH_ROUTES[route]() for route in dict.fromkeys(routes)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def warmup():
+    """
+    Build the agents and exercise their first-call paths (dataset indexes, the Numba
+    image kernel, regex and lookup caches) so the first user request doesn't pay for them
+    No OpenRouter calls are made
+    """
+    try:
+        from PIL import Image
+        
+        get_query_agent().parse("panadol")
+        get_dataset_agent().search("panadol")
+        get_explanation_agent()
+        # A small grey image goes through upscaling and the full enhancement pipeline
+        get_ocr_agent().preprocess_image(Image.new('L', (64, 64), 128))
+        print("🔥 Agents warmed up")
+    except Exception as e:
+        print(f"⚠️ Warmup failed: {e}")
+
+def start_warmup():
+    """
+    Warm in the background so startup isn't blocked; early requests wait on the agent lock.
+    Called from the gunicorn post_worker_init hook and the dev server below, never at import,
+    so no thread is running when a server forks. Set AILTH_WARMUP=0 on serverless hosts
+    to keep cold starts lazy
+    """
+    if os.getenv('AILTH_WARMUP', '1') == '1':
+        threading.Thread(target=warmup, name='ailth-warmup', daemon=True).start()
+
 if __name__ == '__main__':
+    start_warmup()
     app.run(debug=True, port=5000, use_reloader=False)
@@ -1,28 +1,106 @@
 """
 Download EasyOCR models separately (run this once before starting the server)
 This allows the download to complete without timeout issues.
+
+Each model is fetched from its pinned release URL and checked against the pinned SHA-256 and MD5
+in agents/ocr_models.py before it is moved into EASYOCR_MODEL_DIR (default backend/models/easyocr).
+A file that does not match is discarded, never installed. EasyOCR readers are only built through
+get_easyocr_reader(), which re-verifies the files and never downloads, so the directory can be
+baked into a Docker layer.
+
+Maintainers pin the SHA-256 digests with `python download_ocr_models.py --sha256`, run on a
+trusted network: it downloads each model, checks it against the MD5 that easyocr publishes and
+prints its SHA-256 for agents/ocr_models.py. Nothing is installed in that mode.
 """
-import easyocr
+import os
+import sys
+import tempfile
+import urllib.request
+import zipfile
+
+from agents.ocr_models import (
+    MODEL_DIR, PINNED_MODELS, ModelIntegrityError, check_md5, file_digests, get_easyocr_reader, verify_file
+)
+
+def download_model(filename, url, tmp_dir):
+    """Download the archive for one model into tmp_dir and return the extracted file's path"""
+    zip_path = os.path.join(tmp_dir, 'model.zip')
+    urllib.request.urlretrieve(url, zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        archive.extract(filename, tmp_dir)
+    return os.path.join(tmp_dir, filename)
+
+def fetch_model(filename, url):
+    """Download the archive for one model, verify the extracted file, then install it"""
+    with tempfile.TemporaryDirectory(dir=MODEL_DIR) as tmp_dir:
+        extracted = download_model(filename, url, tmp_dir)
+        # Raises before the file ever reaches MODEL_DIR
+        verify_file(filename, extracted)
+        os.replace(extracted, os.path.join(MODEL_DIR, filename))
+
+def print_sha256_pins():
+    """Download every model, check the upstream MD5 and print the SHA-256 to pin"""
+    for filename, pins in PINNED_MODELS.items():
+        print(f"\n🚀 Downloading {filename} from {pins['url']}...")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sha256, md5 = file_digests(download_model(filename, pins['url'], tmp_dir))
+        check_md5(filename, md5)
+        print(f"✅ {filename} matches the upstream MD5")
+        print(f"   'sha256': '{sha256}',")
+
+if '--sha256' in sys.argv[1:]:
+    try:
+        print_sha256_pins()
+        print("\nCopy these into PINNED_MODELS in agents/ocr_models.py")
+    except ModelIntegrityError as e:
+        print(f"\n❌ Downloaded model failed verification: {e}")
+        sys.exit(1)
+    sys.exit(0)
 
 print("=" * 60)
 print("Downloading EasyOCR Models (One-time setup)")
 print("=" * 60)
+print(f"Model directory: {MODEL_DIR}")
 print("This will download ~100MB of models for English OCR")
 print("Please be patient, this may take 5-10 minutes...")
 print("=" * 60)
 
+os.makedirs(MODEL_DIR, exist_ok=True)
 try:
-    print("\n🚀 Initializing EasyOCR Reader...")
-    reader = easyocr.Reader(['en'], gpu=False, verbose=True)
+    # Fail before downloading anything that could never be verified
+    unpinned = [filename for filename, pins in PINNED_MODELS.items() if not pins['sha256']]
+    if unpinned:
+        raise ModelIntegrityError(
+            f"No SHA-256 pinned for {', '.join(unpinned)}; run python download_ocr_models.py --sha256 "
+            f"on a trusted network and pin the output in agents/ocr_models.py"
+        )
+    for filename, pins in PINNED_MODELS.items():
+        path = os.path.join(MODEL_DIR, filename)
+        try:
+            verify_file(filename, path)
+            print(f"\n✅ {filename} already present and verified")
+            continue
+        except ModelIntegrityError:
+            pass
+        print(f"\n🚀 Downloading {filename} from {pins['url']}...")
+        fetch_model(filename, pins['url'])
+        print(f"✅ {filename} verified and installed")
+    # Same offline path the server uses: verify, then load with downloads disabled
+    print("\n🚀 Loading EasyOCR Reader from the verified models...")
+    get_easyocr_reader()
     print("\n" + "=" * 60)
-    print("✅ SUCCESS! EasyOCR models downloaded successfully!")
+    print("✅ SUCCESS! EasyOCR models downloaded and verified!")
     print("=" * 60)
     print("You can now run: python app.py")
-    print("Models are cached and will load instantly next time!")
     print("=" * 60)
+except ModelIntegrityError as e:
+    print(f"\n❌ Model failed verification: {e}")
+    print("Nothing unverified was installed. Do not install models from an untrusted source.")
+    sys.exit(1)
 except Exception as e:
     print(f"\n❌ Error downloading models: {e}")
     print("\nTroubleshooting:")
     print("1. Check your internet connection")
     print("2. Try again later if download servers are busy")
     print("3. Or use a VPN if download is blocked")
+    sys.exit(1)
@@ -0,0 +1,23 @@
+# Gunicorn settings for production: gunicorn app:app  (run from backend/, picks this file up)
+#
+# Requests spend most of their time waiting on OpenRouter, so each worker runs a thread pool
+# (gthread) and many in-flight API calls overlap inside one process. The agents are thread
+# safe and share one HTTP/2 client per process.
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.getenv('GUNICORN_WORKERS', min(4, multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+
+# OCR and explanation calls can take tens of seconds end to end
+timeout = 90
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    """Warm the agents in each worker once it has forked and loaded the app"""
+    from app import start_warmup
+    start_warmup()
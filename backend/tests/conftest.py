@@ -0,0 +1,5 @@
+# Tests import the backend modules the way app.py does (agents.*, utils.*)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
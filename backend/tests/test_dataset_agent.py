@@ -0,0 +1,44 @@
+import pandas as pd
+
+from agents.dataset_agent import DatasetSearchAgent
+
+
+def _agent_with_names(names):
+    """Agent indexed over an in-memory CSV, skipping the data directory"""
+    agent = DatasetSearchAgent.__new__(DatasetSearchAgent)
+    agent.df = pd.DataFrame({'brand_name': names})
+    agent.pdf_data = []
+    agent.build_csv_index()
+    return agent
+
+
+def test_suggest_returns_unique_names():
+    agent = _agent_with_names(['Panadol', 'Panadol', 'Panadol Extra', 'Panadol', 'Brufen', 'Calpol'])
+    suggestions = agent.suggest('panad', k=3)
+    assert len(suggestions) == len(set(suggestions)) == 3
+    assert {'Panadol', 'Panadol Extra'} <= set(suggestions)
+
+
+def test_suggest_clamps_k():
+    agent = _agent_with_names(['Panadol', 'Brufen', 'Calpol'])
+    assert len(agent.suggest('pan', k=0)) == 1
+    assert len(agent.suggest('pan', k=-5)) == 1
+    assert sorted(agent.suggest('pan', k=50)) == ['Brufen', 'Calpol', 'Panadol']
+
+
+def test_search_in_pdf_ignores_blank_names():
+    agent = _agent_with_names(['Panadol'])
+    agent.pdf_data = [{'path': 'leaflet.pdf', 'filename': 'leaflet.pdf'}]
+    agent.name_contexts = {}
+    agent._indexed_names = frozenset()
+    text = 'Flagyl contains metronidazole.'
+    agent._pdf_text = lambda path: (text, text.lower())
+    assert agent.search_in_pdf('') is None
+    assert agent.search_in_pdf('   ') is None
+    assert agent.search_in_pdf('flagyl')['source'] == 'PDF: leaflet.pdf'
+
+
+def test_suggest_ignores_case():
+    agent = _agent_with_names(['PANADOL', 'Banana', 'pan', 'Calpol', 'Ponstan', 'Pandora'])
+    assert agent.suggest('pana', k=1) == ['PANADOL']
+    assert agent.suggest('pana', k=3) == agent.suggest('PANA', k=3)
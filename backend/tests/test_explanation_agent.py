@@ -0,0 +1,36 @@
+import json
+import time
+
+import httpx
+
+from agents.explanation_agent import ExplanationAgent
+
+_EXPLANATION = {
+    'description': 'Paracetamol is an analgesic.',
+    'uses': 'Pain and fever.',
+    'side_effects': ['Nausea'],
+    'warnings': 'Avoid with liver disease.',
+}
+
+
+def _slow_stream(delay):
+    """SSE body whose content only arrives after the headers plus delay"""
+    time.sleep(delay)
+    chunk = {'choices': [{'delta': {'content': json.dumps(_EXPLANATION)}}]}
+    yield f"data: {json.dumps(chunk)}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+
+def test_streamed_latency_covers_the_whole_read():
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.api_url = 'https://openrouter.test/chat'
+    agent.model = 'test-model'
+    agent._avail_cache = None
+    agent._latency_ewma = agent._latency_dev = None
+    agent.client = httpx.Client(transport=httpx.MockTransport(
+        lambda request: httpx.Response(200, content=_slow_stream(0.3))
+    ))
+
+    result = agent._request_explanation('Panadol', 'Paracetamol', 'GSK', True)
+    assert result['uses'] == 'Pain and fever.'
+    assert agent._latency_ewma >= 0.3
@@ -0,0 +1,28 @@
+import pytest
+
+from agents.explanation_agent import ExplanationAgent
+from agents.explanation_core import normalize_brand
+
+
+@pytest.mark.parametrize('brand, expected', [
+    ('Panadol 500mg', 'panadol'),
+    ('  Panadol   500 MG ', 'panadol'),
+    ('Augmentin 1.2 g', 'augmentin'),
+    ('Vitamin B 12', 'vitamin b 12'),
+    ('Vitamin B 6', 'vitamin b 6'),
+    ('Omega 3', 'omega 3'),
+    ('Insulin 70/30', 'insulin 70/30'),
+])
+def test_normalize_brand_strips_only_a_trailing_strength(brand, expected):
+    assert normalize_brand(brand) == expected
+
+
+def test_numbered_names_keep_separate_cache_keys():
+    agent = ExplanationAgent.__new__(ExplanationAgent)
+    agent.set_canonical_brands(['Vitamin B 12', 'Vitamin B 6', 'Omega 3', 'Insulin 70/30', 'Panadol'])
+    brands = ['vitamin b 12', 'vitamin b 6', 'vitamin b 1', 'omega 3', 'omega', 'insulin 70/30', 'insulin']
+    keys = {agent._cache_key(brand, '', '', True) for brand in brands}
+    assert len(keys) == len(brands)
+    # A misspelling with the same numbers still folds onto the known brand
+    assert agent._canonical_brand('vitamn b 12') == 'vitamin b 12'
+    assert agent._canonical_brand('Panadool 500mg') == 'panadol'
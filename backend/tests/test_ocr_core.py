@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from agents.ocr_core import is_medicine_related
+
+# OCRAgent.medicine_patterns before detection moved into ocr_core, kept verbatim as the reference
+_BASELINE_PATTERNS = [
+    re.compile(r'\b\d+\s*(mg|ml|mcg|g|ml|L|IU|units?)\b', re.IGNORECASE),  # Dosage
+    re.compile(r'\b(tablet|capsule|syrup|injection|cream|ointment|gel|drops|suspension|solution|powder|spray|inhaler|patch)\b', re.IGNORECASE),  # Form
+    re.compile(r'\b(oral|topical|intravenous|intramuscular|subcutaneous|transdermal)\b', re.IGNORECASE),  # Route
+    re.compile(r'\b(expiry|exp\.?|mfg\.?|batch|lot)\s*:?\s*\d+', re.IGNORECASE),  # Package info
+    re.compile(r'\b(pharmaceutical|pharma|medicine|medication|drug|rx|℞)\b', re.IGNORECASE),  # Medical terms
+    re.compile(r'\b(paracetamol|aspirin|ibuprofen|amoxicillin|metformin|omeprazole)\b', re.IGNORECASE),  # Common drugs
+]
+_BASELINE_TYPES = ['dosage', 'form', 'route', 'package', 'medical', 'drug_name']
+_BASELINE_WEIGHTS = [0.25, 0.20, 0.15, 0.15, 0.15, 0.10]
+
+
+def _baseline(text):
+    """The original _is_medicine_related, with repeated matches dropped in first-seen order"""
+    if not text or len(text.strip()) < 10:
+        return False, 0.0, []
+    detected_patterns = []
+    confidence = 0.0
+    for pattern, pattern_type, weight in zip(_BASELINE_PATTERNS, _BASELINE_TYPES, _BASELINE_WEIGHTS):
+        matches = list(dict.fromkeys(pattern.findall(text)))
+        if matches:
+            detected_patterns.append({'type': pattern_type, 'matches': matches[:3], 'weight': weight})
+            confidence += weight
+    return confidence >= 0.3, min(confidence, 1.0), detected_patterns
+
+
+@pytest.mark.parametrize('text', [
+    'Panadol 500mg/5ml Tablet/Capsule ORAL Exp: 12/25 Batch 123 Paracetamol PHARMA',
+    'PANADOL\nParacetamol 500 mg\nTablets\nGSK Pharmaceutical Ltd\nMfg. 03/24 Exp. 02/27',
+    'Brufen Syrup (Ibuprofen) 100mg/5mL oral suspension; drug, Rx only. Lot:A12 lot 9',
+    'Augmentin 625mg tablet tablet TABLET Amoxicillin/Clavulanate Expiry:2026 batch:77 batch 78',
+    'Cream/Gel/Spray/Drops for topical use 10 g 5 IU 2 units 1 L',
+    'Keep out of reach of children. Store between 15-30 C.',
+    'short',
+])
+def test_detected_patterns_match_baseline(text):
+    assert is_medicine_related(text) == _baseline(text)
+
+
+def test_slash_joined_tokens_keep_case_and_order():
+    _, _, detected = is_medicine_related('Panadol 500mg/5ml Tablet/Capsule ORAL')
+    by_type = {pattern['type']: pattern['matches'] for pattern in detected}
+    assert by_type['dosage'] == ['mg', 'ml']
+    assert by_type['form'] == ['Tablet', 'Capsule']
+    assert by_type['route'] == ['ORAL']
@@ -0,0 +1,42 @@
+import hashlib
+
+import pytest
+
+from agents import ocr_models
+from agents.ocr_models import ModelIntegrityError, verify_file
+
+_CONTENT = b'model weights'
+
+
+@pytest.fixture
+def model_file(tmp_path, monkeypatch):
+    path = tmp_path / 'model.pth'
+    path.write_bytes(_CONTENT)
+    monkeypatch.setattr(ocr_models, 'PINNED_MODELS', {'model.pth': {
+        'url': 'https://example.invalid/model.zip',
+        'sha256': hashlib.sha256(_CONTENT).hexdigest(),
+        'md5': hashlib.md5(_CONTENT).hexdigest(),
+    }})
+    return path
+
+
+def test_verify_file_accepts_pinned_contents(model_file):
+    verify_file('model.pth', str(model_file))
+
+
+def test_verify_file_rejects_altered_contents(model_file):
+    model_file.write_bytes(_CONTENT + b'!')
+    with pytest.raises(ModelIntegrityError, match='SHA-256'):
+        verify_file('model.pth', str(model_file))
+
+
+def test_verify_file_refuses_models_without_a_sha256_pin(model_file):
+    ocr_models.PINNED_MODELS['model.pth']['sha256'] = ''
+    with pytest.raises(ModelIntegrityError, match='No SHA-256 pinned'):
+        verify_file('model.pth', str(model_file))
+
+
+def test_verify_file_reports_missing_files(model_file):
+    model_file.unlink()
+    with pytest.raises(ModelIntegrityError, match='not found'):
+        verify_file('model.pth', str(model_file))
@@ -0,0 +1,88 @@
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from utils.search import MedicineSearchEngine, _cosine_scores, _quantize_rows
+
+
+def _unit_rows(rng, n, d=384):
+    matrix = rng.standard_normal((n, d)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def _noisy_queries(rng, matrix, count=20):
+    """Queries close to a known row, like a misspelling of a known brand"""
+    rows = rng.choice(len(matrix), count, replace=False)
+    queries = _unit_rows(rng, count, matrix.shape[1]) * 0.5 + matrix[rows]
+    return rows, queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def test_float16_scores_rank_like_float32():
+    rng = np.random.default_rng(0)
+    # More rows than one scoring block so the blocked path is exercised
+    matrix = _unit_rows(rng, 2500)
+    rows, queries = _noisy_queries(rng, matrix)
+    for row, query in zip(rows, queries):
+        exact = _cosine_scores(matrix, query)
+        half = _cosine_scores(matrix.astype(np.float16), query)
+        assert half.dtype == np.float32
+        assert np.argmax(half) == np.argmax(exact) == row
+        assert np.max(np.abs(half - exact)) < 1e-3
+
+
+def test_int8_scores_rank_like_float32():
+    rng = np.random.default_rng(1)
+    matrix = _unit_rows(rng, 2500)
+    quantized, scale = _quantize_rows(matrix)
+    rows, queries = _noisy_queries(rng, matrix)
+    for row, query in zip(rows, queries):
+        scores = _cosine_scores(quantized, query, scale)
+        assert scores.dtype == np.float32
+        assert np.argmax(scores) == np.argmax(_cosine_scores(matrix, query)) == row
+
+
+class _FixedEncoder:
+    """Stands in for the sentence-transformers model with fixed unit vectors"""
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self.vectors[texts]
+        return np.stack([self.vectors[text] for text in texts])
+
+
+def test_int8_semantic_search_picks_float32_top1():
+    rng = np.random.default_rng(2)
+    names = ['Panadol', 'Brufen', 'Flagyl', 'Augmentin', 'Disprin', 'Calpol', 'Ponstan', 'Arinac']
+    matrix = _unit_rows(rng, len(names), d=32)
+    rows, queries = _noisy_queries(rng, matrix, count=len(names))
+    vectors = dict(zip(names, matrix))
+    vectors.update((f"query {i}", query) for i, query in enumerate(queries))
+
+    exact = MedicineSearchEngine()
+    exact.model = _FixedEncoder(vectors)
+    compact = MedicineSearchEngine(embedding_dtype=np.int8)
+    compact.model = exact.model
+    # Registered candidates without build_index, so nothing is written to the embedding cache
+    compact._candidates = names
+    compact._cand_emb, compact._cand_scale = _quantize_rows(matrix)
+    for i, row in enumerate(rows):
+        found, score = compact.semantic_search(f"query {i}", names, threshold=0.0)
+        assert found == exact.semantic_search(f"query {i}", names, threshold=0.0)[0] == names[row]
+        assert abs(score - float(matrix[row] @ queries[i])) < 0.02
+
+
+def test_registered_fuzzy_search_matches_full_scan():
+    names = ['Panadol', 'Panadol Extra', 'Brufen', 'Flagyl', 'Augmentin', 'Disprin',
+             'Calpol', 'Ponstan', 'Arinac', 'Abdc', 'Amoxil', 'Amoxicillin', 'Ibuprofen']
+    engine = MedicineSearchEngine()
+    engine.set_candidates(names)
+    prepped = [name.lower() for name in names]
+    # Includes transpositions and short names that share no trigram with their target
+    for query in ['panadol', 'PANADOL extr', 'brufn', 'abcd', 'amoxil', 'ibuprofin', 'calop', 'zzzz']:
+        expected = process.extractOne(query.lower(), prepped, scorer=fuzz.ratio, processor=None, score_cutoff=70)
+        found, score = engine.fuzzy_search(query, names, threshold=70)
+        if expected is None:
+            assert (found, score) == (None, 0.0)
+        else:
+            assert (found, score) == (names[expected[2]], expected[1] / 100.0)
@@ -1,4 +1,4 @@
-from .search import MedicineSearchEngine
+from .search import MedicineSearchEngine, get_embedding_model
 from .preprocessing import ImagePreprocessor
 
-__all__ = ['MedicineSearchEngine', 'ImagePreprocessor']
+__all__ = ['MedicineSearchEngine', 'ImagePreprocessor', 'get_embedding_model']
@@ -1,26 +1,173 @@
+from bisect import bisect_left
+import hashlib
 from rapidfuzz import fuzz, process
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import os
+import threading
+
+# Fuzzy scores above this are trusted without consulting the embedding model
+HIGH_CONFIDENCE = 0.85
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Candidate embeddings are saved here so a restart memory-maps them instead of re-encoding
+EMBEDDING_CACHE_DIR = os.getenv(
+    'EMBEDDING_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
+)
+
+# One SentenceTransformer per process, shared by every engine and loaded on first use
+_model_lock = threading.Lock()
+_embedding_models = {}
+
+def get_embedding_model(name=EMBEDDING_MODEL_NAME):
+    """Load the named embedding model once; concurrent first callers wait for the same load"""
+    model = _embedding_models.get(name)
+    if model is None:
+        with _model_lock:
+            model = _embedding_models.get(name)
+            if model is None:
+                # Imported here so torch is only loaded when semantic search is actually used
+                from sentence_transformers import SentenceTransformer
+                model = _embedding_models[name] = SentenceTransformer(name)
+    return model
+
+def _quantize_rows(matrix):
+    """Symmetric int8 quantization with one float32 scale per row: row ~= q_row * scale"""
+    scale = np.abs(matrix).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.rint(matrix / scale[:, None]).astype(np.int8)
+    return np.ascontiguousarray(quantized), scale.astype(np.float32)
+
+# Rows upcast to float32 at a time when scoring a compact matrix (~1.5 MB of float32 per block)
+SCORE_BLOCK_ROWS = 1024
+
+def _cosine_scores(matrix, query, row_scale=None):
+    """
+    matrix @ query accumulated in float32. float32 matrices go straight to BLAS; compact
+    (float16/int8) ones are upcast one block of rows at a time, so there is never a full
+    float32 (or int32) copy and NumPy's scalar half-precision loop is never used.
+    row_scale holds the per-row dequantization scales of an int8 matrix
+    """
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    if matrix.dtype == np.float32:
+        scores = matrix @ query
+    else:
+        scores = np.empty(matrix.shape[0], dtype=np.float32)
+        for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = matrix[start:start + SCORE_BLOCK_ROWS]
+            np.dot(block.astype(np.float32), query, out=scores[start:start + len(block)])
+    if row_scale is not None:
+        scores *= row_scale
+    return scores
+
+def _save_array(path, array):
+    """np.save through a temp file and rename so concurrent workers never map a half-written file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
 
 class MedicineSearchEngine:
-    def __init__(self):
+    def __init__(self, embedding_dtype=np.float32):
         self.model = None
+        # Storage type of the candidate matrix; float16 halves its memory and int8 (per-row
+        # scaled) quarters it, each at a small precision cost
+        self.embedding_dtype = np.dtype(embedding_dtype)
         self.embeddings_cache = {}
+        # Candidate list registered with set_candidates and its lowercased copy
+        self._candidates = None
+        self._candidates_prepped = None
+        # Lowercased name -> original for O(1) exact hits, and the same pairs sorted for prefix lookups
+        self._exact_index = {}
+        self._sorted_prepped = ()
+        # L2-normalized candidate embeddings, one row per registered candidate
+        self._cand_emb = None
+        # Per-row dequantization scales when the matrix is stored as int8
+        self._cand_scale = None
+    
+    def set_candidates(self, names):
+        """Register the usual candidate list so searches against it skip per-query normalization"""
+        self._candidates = names
+        self._candidates_prepped = [name.lower().strip() for name in names]
+        self._exact_index = {}
+        for prepped, name in zip(self._candidates_prepped, names):
+            self._exact_index.setdefault(prepped, name)
+        self._sorted_prepped = tuple(sorted(self._exact_index.items()))
+        self._cand_emb = None
+        self._cand_scale = None
+        if self.model is not None:
+            self.build_index(names)
+    
+    def build_index(self, candidates):
+        """Embed the registered candidates once (or map a previous run's copy) so queries only encode themselves"""
+        quantized = self.embedding_dtype == np.int8
+        cache_path = self._embedding_cache_path(candidates)
+        scale_path = cache_path[:-len('.npy')] + '-scale.npy'
+        try:
+            # Read-only pages shared by every worker that maps the same file
+            cand_scale = np.load(scale_path) if quantized else None
+            self._cand_emb = np.load(cache_path, mmap_mode='r')
+            self._cand_scale = cand_scale
+            print(f"Loaded {len(candidates)} candidate embeddings from {cache_path}")
+            return
+        except (OSError, ValueError):
+            pass
+        
+        try:
+            embeddings = np.ascontiguousarray(self.model.encode(
+                candidates, batch_size=64, normalize_embeddings=True, convert_to_numpy=True
+            ), dtype=np.float32)
+            if quantized:
+                self._cand_emb, self._cand_scale = _quantize_rows(embeddings)
+            else:
+                self._cand_emb = embeddings.astype(self.embedding_dtype, copy=False)
+                self._cand_scale = None
+            print(f"Embedded {len(candidates)} candidates for semantic search")
+        except Exception as e:
+            print(f"Could not build embedding index: {e}")
+            self._cand_emb = self._cand_scale = None
+            return
+        
+        try:
+            os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+            # Scales first: the matrix file is what marks the cache entry complete
+            if quantized:
+                _save_array(scale_path, self._cand_scale)
+            _save_array(cache_path, self._cand_emb)
+        except OSError as e:
+            print(f"Could not save embedding index: {e}")
+    
+    def _embedding_cache_path(self, candidates):
+        """Cache file for these exact candidates (in order), model and dtype"""
+        key = hashlib.sha256(f"{EMBEDDING_MODEL_NAME}\0{self.embedding_dtype.str}\0".encode())
+        key.update('\n'.join(candidates).encode('utf-8'))
+        return os.path.join(EMBEDDING_CACHE_DIR, f"embeddings-{key.hexdigest()[:16]}.npy")
         
     def load_embedding_model(self):
         """Load sentence transformer model for semantic search"""
         try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = get_embedding_model()
             print("Embedding model loaded successfully")
+            if self._candidates is not None:
+                self.build_index(self._candidates)
         except Exception as e:
             print(f"Could not load embedding model: {e}")
             self.model = None
     
     def fuzzy_search(self, query, candidates, threshold=70):
         """Fuzzy string matching"""
-        result = process.extractOne(query, candidates, scorer=fuzz.ratio)
-        if result and result[1] >= threshold:
+        # score_cutoff lets rapidfuzz abandon weak candidates early
+        if candidates is self._candidates:
+            # Registered candidates are already lowercased, so rapidfuzz compares them as-is
+            result = process.extractOne(query.lower().strip(), self._candidates_prepped,
+                                        scorer=fuzz.ratio, processor=None, score_cutoff=threshold)
+            if result is not None:
+                return candidates[result[2]], result[1] / 100.0
+            return None, 0.0
+        
+        result = process.extractOne(query, candidates, scorer=fuzz.ratio, score_cutoff=threshold)
+        if result is not None:
             return result[0], result[1] / 100.0
         return None, 0.0
     
@@ -30,19 +177,25 @@ class MedicineSearchEngine:
             return None, 0.0
         
         try:
-            query_embedding = self.model.encode(query)
-            candidate_embeddings = self.model.encode(candidates)
+            candidate_scale = None
+            if candidates is self._candidates and self._cand_emb is not None:
+                candidate_embeddings, candidate_scale = self._cand_emb, self._cand_scale
+            else:
+                candidate_embeddings = np.ascontiguousarray(
+                    self.model.encode(candidates, normalize_embeddings=True, convert_to_numpy=True),
+                    dtype=np.float32
+                )
+            query_embedding = self.model.encode(query, normalize_embeddings=True, convert_to_numpy=True)
             
-            # Calculate cosine similarity
-            similarities = np.dot(candidate_embeddings, query_embedding) / (
-                np.linalg.norm(candidate_embeddings, axis=1) * np.linalg.norm(query_embedding)
-            )
+            # Rows and query are unit length, so cosine similarity is a single matrix-vector product
+            # (int8 rows are upcast exactly to float32 block by block, then rescaled per row)
+            similarities = _cosine_scores(candidate_embeddings, query_embedding, candidate_scale)
             
-            best_idx = np.argmax(similarities)
-            best_score = similarities[best_idx]
+            best_idx = int(np.argmax(similarities))
+            best_score = float(similarities[best_idx])
             
             if best_score >= threshold:
-                return candidates[best_idx], float(best_score)
+                return candidates[best_idx], best_score
             
         except Exception as e:
             print(f"Semantic search error: {e}")
@@ -51,10 +204,23 @@ class MedicineSearchEngine:
     
     def hybrid_search(self, query, candidates, threshold=70):
         """Combine fuzzy and semantic search"""
+        if candidates is self._candidates:
+            query_prepped = query.lower().strip()
+            # Exact brand names are a dict hit
+            hit = self._exact_index.get(query_prepped)
+            if hit is not None:
+                return hit, 1.0
+            # A close prefix match ("panadol" -> "panadol extra") also settles it
+            i = bisect_left(self._sorted_prepped, (query_prepped,))
+            if query_prepped and i < len(self._sorted_prepped) and self._sorted_prepped[i][0].startswith(query_prepped):
+                prefix_score = fuzz.ratio(query_prepped, self._sorted_prepped[i][0]) / 100.0
+                if prefix_score > HIGH_CONFIDENCE:
+                    return self._sorted_prepped[i][1], prefix_score
+        
         # Try fuzzy first (faster)
         fuzzy_result, fuzzy_score = self.fuzzy_search(query, candidates, threshold)
         
-        if fuzzy_score > 0.85:  # High confidence
+        if fuzzy_score > HIGH_CONFIDENCE:  # High confidence
             return fuzzy_result, fuzzy_score
         
         # Try semantic search